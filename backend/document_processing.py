@@ -0,0 +1,53 @@
+"""
+CPU-heavy document processing steps, run in a process pool by function_app.
+Kept free of Azure imports so pool workers start quickly.
+"""
+import io
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # optional: PDFs are then only hashed
+    PdfReader = None
+
+try:
+    from PIL import Image
+except ImportError:  # optional: no thumbnails without Pillow
+    Image = None
+
+TEXT_LIMIT_CHARS = 1_000_000
+THUMBNAIL_SIZE = (256, 256)
+
+
+def extract_derived(path: str, mime_type: str):
+    """
+    Derive searchable text, page count and a PNG thumbnail from a file.
+    Returns {"page_count": int|None, "text": str|None, "thumbnail": bytes|None}.
+    """
+    result = {"page_count": None, "text": None, "thumbnail": None}
+    mime_type = mime_type or ""
+
+    if mime_type == "application/pdf" and PdfReader is not None:
+        reader = PdfReader(path)
+        result["page_count"] = len(reader.pages)
+        parts = []
+        size = 0
+        for page in reader.pages:
+            text = page.extract_text() or ""
+            parts.append(text)
+            size += len(text)
+            if size >= TEXT_LIMIT_CHARS:
+                break
+        result["text"] = "\n".join(parts)[:TEXT_LIMIT_CHARS]
+
+    elif mime_type.startswith("text/"):
+        with open(path, "rb") as f:
+            result["text"] = f.read(TEXT_LIMIT_CHARS).decode("utf-8", errors="replace")
+
+    elif mime_type.startswith("image/") and Image is not None:
+        with Image.open(path) as image:
+            image.thumbnail(THUMBNAIL_SIZE)
+            buffer = io.BytesIO()
+            image.convert("RGB").save(buffer, format="PNG")
+            result["thumbnail"] = buffer.getvalue()
+
+    return result
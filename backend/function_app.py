@@ -1,11 +1,36 @@
 import azure.functions as func
+import asyncio
 import logging
 import os
 import json
+import base64
+import codecs
+import csv
+import gzip
+import io
+import itertools
+import hashlib
+import hmac
+import random
+import re
 import uuid
-from datetime import datetime
+import zipfile
+import time
+import tempfile
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
 import mimetypes  # NEW: For guessing file types
-from azure.storage.blob import BlobServiceClient
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.storage.blob import (
+    BlobBlock, BlobSasPermissions, BlobServiceClient, ContentSettings, StandardBlobTier, generate_blob_sas
+)
+
+import document_processing
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
@@ -20,17 +45,187 @@ if not BLOB_CONNECTION_STRING:
 
 blob_service_client = BlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING)
 
+# --- Lookup cache config (id -> summary, used by ?expand=) ---
+SUMMARY_CACHE_TTL_SECONDS = int(os.getenv("SUMMARY_CACHE_TTL_SECONDS", "60"))
+SUMMARY_MISS_REFRESH_SECONDS = int(os.getenv("SUMMARY_MISS_REFRESH_SECONDS", "5"))  # DELETE of an unknown id
+_summary_cache = {}  # blob_path -> (loaded_at, {id: summary})
+
+# --- Change feed config ---
+CHANGE_LOG_LIMIT = int(os.getenv("CHANGE_LOG_LIMIT", "500"))
+
+# --- Conditional (ETag) write config ---
+CONDITIONAL_WRITE_RETRIES = int(os.getenv("CONDITIONAL_WRITE_RETRIES", "10"))
+
+# --- Soft delete / purge config ---
+ORPHAN_BLOB_GRACE_HOURS = int(os.getenv("ORPHAN_BLOB_GRACE_HOURS", "24"))
+BLOB_BATCH_SIZE = 256  # max sub-requests per Blob batch call
+
+# --- Archival config ---
+ARCHIVE_COMPLETED_AFTER_DAYS = int(os.getenv("ARCHIVE_COMPLETED_AFTER_DAYS", "30"))
+ARCHIVE_REMINDERS_AFTER_DAYS = int(os.getenv("ARCHIVE_REMINDERS_AFTER_DAYS", "7"))
+ARCHIVE_BLOB_TIER = os.getenv("ARCHIVE_BLOB_TIER") or None  # e.g. "Cool"; closed partitions only
+if ARCHIVE_BLOB_TIER:
+    # Fail at startup, not in the nightly job; Archive tier blobs cannot be read without rehydration
+    ARCHIVE_BLOB_TIER = StandardBlobTier(ARCHIVE_BLOB_TIER)
+    if ARCHIVE_BLOB_TIER == StandardBlobTier.ARCHIVE:
+        raise ValueError("ARCHIVE_BLOB_TIER must be an online tier (e.g. Cool or Cold), not Archive")
+ARCHIVE_READ_CONCURRENCY = int(os.getenv("ARCHIVE_READ_CONCURRENCY", "8"))
+
+# --- Read coalescing / admission control config ---
+MAX_STORAGE_CONCURRENCY = int(os.getenv("MAX_STORAGE_CONCURRENCY", "32"))
+STORAGE_ADMISSION_TIMEOUT_SECONDS = float(os.getenv("STORAGE_ADMISSION_TIMEOUT_SECONDS", "2"))
+STORAGE_RETRY_AFTER_SECONDS = int(os.getenv("STORAGE_RETRY_AFTER_SECONDS", "1"))
+
+_storage_slots = threading.BoundedSemaphore(MAX_STORAGE_CONCURRENCY)
+_inflight_lock = threading.Lock()
+_inflight_reads = {}  # blob_path -> {"done": Event, "data": bytes, "error": Exception}
+
+# --- Login / session token config ---
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+SESSION_TTL_HOURS = int(os.getenv("SESSION_TTL_HOURS", "12"))
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "false").lower() == "true"
+
+# --- Idempotency-Key config ---
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_MEMORY_LIMIT = int(os.getenv("IDEMPOTENCY_MEMORY_LIMIT", "1000"))
+
+_idempotency_lock = threading.Lock()
+_idempotency_memory = {}  # blob_path -> stored record, oldest first
+_idempotency_inflight = {}  # blob_path -> id() of the request handling it on this worker
+
+# --- Content-addressed document storage config ---
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+UPLOAD_SPOOL_MAX_BYTES = int(os.getenv("UPLOAD_SPOOL_MAX_BYTES", str(4 * 1024 * 1024)))
+CONTENT_REF_RETRIES = 5
+
+# --- Document processing (queue worker) config ---
+DOCUMENT_PROCESS_WORKERS = int(os.getenv("DOCUMENT_PROCESS_WORKERS", "2"))
+# Per document; keep well below functionTimeout in host.json
+DOCUMENT_PROCESS_TIMEOUT_SECONDS = float(os.getenv("DOCUMENT_PROCESS_TIMEOUT_SECONDS", "120"))
+DOCUMENT_PROCESSING_MAX_ATTEMPTS = 5  # keep in step with queues.maxDequeueCount in host.json
+
+_process_pool = None  # created on first use; CPU-heavy extraction runs here
+_process_pool_lock = threading.Lock()
+
+# --- Export / import config ---
+EXPORT_BLOCK_BYTES = 4 * 1024 * 1024
+EXPORT_LINK_MINUTES = int(os.getenv("EXPORT_LINK_MINUTES", "15"))
+EXPORT_TTL_HOURS = int(os.getenv("EXPORT_TTL_HOURS", "24"))
+
+# Column order for CSV exports (and the fields read back from CSV imports)
+EXPORT_FIELDS = {
+    "employees": ["id", "name", "email", "position", "department", "role", "created_at", "updated_at"],
+    "tasks": ["id", "title", "description", "employee_id", "status", "due_date",
+              "created_at", "updated_at"],
+    "reminders": ["id", "title", "description", "reminder_date", "employee_id",
+                  "created_at", "updated_at"],
+    "documents": ["id", "title", "description", "file_name", "file_size", "mime_type",
+                  "blob_name", "content_sha256", "employee_id", "employee_name",
+                  "task_id", "task_name", "created_at", "updated_at"],
+}
+
+# Required fields per importable entity (same rules as the create endpoints)
+IMPORT_REQUIRED_FIELDS = {
+    "employees": ["name", "email", "position", "department"],
+    "tasks": ["title", "employee_id"],
+    "reminders": ["title", "employee_id", "reminder_date"],
+}
+
+# --- Document bundle (ZIP) config ---
+BUNDLE_CONCURRENCY = int(os.getenv("BUNDLE_CONCURRENCY", "4"))
+BUNDLE_CACHE_HOURS = int(os.getenv("BUNDLE_CACHE_HOURS", "24"))
+
+# --- Synthetic seed data config (setup-data?seed=) ---
+SEED_ENABLED = os.getenv("SEED_ENABLED", "false").lower() == "true"  # replaces live data; off in production
+SEED_ENTITIES = ("employees", "tasks", "reminders", "documents")
+SEED_MAX_RECORDS = int(os.getenv("SEED_MAX_RECORDS", "1000000"))
+SEED_UPLOAD_CONCURRENCY = int(os.getenv("SEED_UPLOAD_CONCURRENCY", "16"))
+
+# --- Subscription (long-poll / SSE) config ---
+SUBSCRIBE_MAX_WAIT_SECONDS = int(os.getenv("SUBSCRIBE_MAX_WAIT_SECONDS", "55"))
+SUBSCRIBE_RECHECK_SECONDS = int(os.getenv("SUBSCRIBE_RECHECK_SECONDS", "10"))
+SUBSCRIBE_ENTITIES = ("tasks", "reminders")
+
+# Local pub/sub stand-in: mutation handlers on this worker publish here and
+# waiting subscribers wake up. Changes made on other instances are picked
+# up by re-reading the change logs every SUBSCRIBE_RECHECK_SECONDS.
+# Subscribers are async and park on an asyncio.Event each; publishers run on
+# the sync handler threads and set those events through their event loop.
+_publish_lock = threading.Lock()
+_published_changes = []  # (seq, entity, {employee_id, ...}), newest last
+_publish_seq = 0
+_change_waiters = set()  # (event loop, asyncio.Event) of parked subscribers
+
 
 # ---------- Internal helpers ----------
 
+class StorageBusyError(Exception):
+    """Raised when this worker already has MAX_STORAGE_CONCURRENCY storage calls running."""
+
+
+@contextmanager
+def _storage_slot():
+    """
+    Admission control for Storage calls on this worker. Waits up to
+    STORAGE_ADMISSION_TIMEOUT_SECONDS for a slot, then sheds the request.
+    """
+    if not _storage_slots.acquire(timeout=STORAGE_ADMISSION_TIMEOUT_SECONDS):
+        raise StorageBusyError("Storage is busy, retry later")
+    try:
+        yield
+    finally:
+        _storage_slots.release()
+
+
+def _list_blob_names(container_client, prefix: str = None):
+    """Blob names under a prefix; the listing's page requests run inside one slot."""
+    with _storage_slot():
+        return list(container_client.list_blob_names(name_starts_with=prefix))
+
+
+def _list_blobs(container_client, prefix: str = None):
+    """Blob properties under a prefix, listed inside one slot like _list_blob_names."""
+    with _storage_slot():
+        return list(container_client.list_blobs(name_starts_with=prefix))
+
+
+def _download_coalesced(blob_path: str):
+    """
+    Single-flight download: concurrent readers of the same blob path share
+    one in-flight download. Returns the raw bytes (each caller decodes its
+    own copy, since handlers mutate what they read).
+    """
+    with _inflight_lock:
+        flight = _inflight_reads.get(blob_path)
+        leader = flight is None
+        if leader:
+            flight = {"done": threading.Event(), "data": None, "error": None}
+            _inflight_reads[blob_path] = flight
+
+    if not leader:
+        flight["done"].wait()
+        if flight["error"] is not None:
+            raise flight["error"]
+        return flight["data"]
+
+    try:
+        container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+        with _storage_slot():
+            flight["data"] = container_client.get_blob_client(blob_path).download_blob().readall()
+        return flight["data"]
+    except Exception as e:
+        flight["error"] = e
+        raise
+    finally:
+        with _inflight_lock:
+            if _inflight_reads.get(blob_path) is flight:
+                del _inflight_reads[blob_path]
+        flight["done"].set()
+
+
 def _get_blob_json(blob_path: str):
     """Read JSON from a blob path in the data container."""
-    # Uses the global client and container constant
-    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
-    blob_client = container_client.get_blob_client(blob_path)
-
-    download_stream = blob_client.download_blob()
-    data = download_stream.readall().decode("utf-8")
+    data = _download_coalesced(blob_path).decode("utf-8")
     return json.loads(data)
 
 
@@ -41,7 +236,320 @@ def _set_blob_json(blob_path: str, data):
     blob_client = container_client.get_blob_client(blob_path)
 
     json_bytes = json.dumps(data, indent=2).encode("utf-8")
-    blob_client.upload_blob(json_bytes, overwrite=True)
+    with _storage_slot():
+        blob_client.upload_blob(json_bytes, overwrite=True)
+
+    _invalidate_blob_json(blob_path)
+
+
+def _get_blob_json_for_update(blob_path: str):
+    """
+    Read JSON together with the blob's ETag, for a conditional write-back.
+    Bypasses read coalescing: a shared download may be older than the ETag.
+    Returns (data, etag), or (None, None) when the blob does not exist.
+    """
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    try:
+        with _storage_slot():
+            downloader = container_client.get_blob_client(blob_path).download_blob()
+            data = downloader.readall()
+    except ResourceNotFoundError:
+        return None, None
+    return json.loads(data.decode("utf-8")), downloader.properties.etag
+
+
+def _set_blob_json_if_unchanged(blob_path: str, data, etag):
+    """
+    Write JSON only if the blob still has `etag` (etag None: only if it does
+    not exist yet). Raises ResourceModifiedError / ResourceExistsError when
+    another writer got there first.
+    """
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    blob_client = container_client.get_blob_client(blob_path)
+
+    json_bytes = json.dumps(data, indent=2).encode("utf-8")
+    with _storage_slot():
+        if etag is None:
+            blob_client.upload_blob(json_bytes, overwrite=False)
+        else:
+            blob_client.upload_blob(
+                json_bytes, overwrite=True, etag=etag, match_condition=MatchConditions.IfNotModified
+            )
+
+    _invalidate_blob_json(blob_path)
+
+
+def _update_blob_json(blob_path: str, mutate):
+    """
+    Optimistic read-modify-write of a JSON blob. mutate(data) gets the
+    current contents (None when missing) and returns (new_data, result);
+    new_data None skips the write. On a concurrent write the blob is re-read
+    and mutate runs again, like the refcount helpers. Returns result.
+    """
+    for _ in range(CONDITIONAL_WRITE_RETRIES):
+        data, etag = _get_blob_json_for_update(blob_path)
+        new_data, result = mutate(data)
+        if new_data is None:
+            return result
+        try:
+            _set_blob_json_if_unchanged(blob_path, new_data, etag)
+            return result
+        except (ResourceModifiedError, ResourceExistsError):
+            continue
+
+    raise RuntimeError(f"Could not update {blob_path}: too many concurrent writers")
+
+
+def _append_record(blob_path: str, record: dict):
+    """Append one record to a collection blob with a conditional write."""
+    def append(items):
+        items = items if isinstance(items, list) else []
+        items.append(record)
+        return items, None
+
+    _update_blob_json(blob_path, append)
+
+
+def _update_record(blob_path: str, item_id: str, updates: dict):
+    """
+    Apply `updates` to one record of a collection blob with a conditional
+    write, so records purged or written meanwhile are not brought back or lost.
+    Returns (record, previous copy), or (None, None) when the record is gone.
+    """
+    def apply(items):
+        current, _ = _find_by_id(items or [], item_id)
+        if not current:
+            return None, (None, None)
+        previous = dict(current)
+        current.update(updates)
+        return items, (current, previous)
+
+    return _update_blob_json(blob_path, apply)
+
+
+def _invalidate_blob_json(blob_path: str):
+    """
+    Any write makes the cached summaries for this collection stale, and
+    reads that start from now on must not join a download begun before it.
+    """
+    _summary_cache.pop(blob_path, None)
+    with _inflight_lock:
+        _inflight_reads.pop(blob_path, None)
+
+
+def _iter_blob_records(blob_path: str, properties: dict = None):
+    """
+    Yield the items of a JSON array blob one by one, reading it in ranged
+    chunks, so memory stays bounded by the chunk size, not the collection.
+    Raises ValueError if the blob ends before the closing "]". If given,
+    properties["etag"] is set to the ETag of the version being read.
+    """
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    with _storage_slot():
+        downloader = container_client.get_blob_client(blob_path).download_blob()
+    if properties is not None:
+        properties["etag"] = downloader.properties.etag
+    chunks = downloader.chunks()
+
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+    finished = False
+
+    while True:
+        # A slot per ranged read; the consumer's work between reads holds none
+        with _storage_slot():
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        buffer += text.decode(chunk)
+        pos = 0
+        while not finished:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if started and buffer[pos] == "]":
+                finished = True
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"{blob_path} is not a JSON array")
+                started = True
+                pos += 1
+                continue
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                break  # item continues in the next chunk
+            yield item
+        buffer = buffer[pos:]
+
+    if not finished:
+        raise ValueError(f"{blob_path} is truncated (no closing ']')")
+
+
+def _upload_in_blocks(blob_client, byte_chunks, content_type: str, etag=None):
+    """
+    Upload an iterable of byte chunks as a block blob, staging a block every
+    EXPORT_BLOCK_BYTES. The blob is replaced atomically on commit.
+    Block ids carry a per-upload token, so two concurrent uploads to the same
+    blob never commit each other's staged blocks. With `etag` the commit only
+    succeeds if the blob is still that version (ResourceModifiedError otherwise).
+    Returns the number of bytes written.
+    """
+    upload_token = uuid.uuid4().hex
+    block_ids = []
+    pending = []
+    pending_size = 0
+    total = 0
+
+    def stage():
+        block_id = base64.b64encode(f"{upload_token}-{len(block_ids):08d}".encode("ascii")).decode("ascii")
+        with _storage_slot():
+            blob_client.stage_block(block_id, b"".join(pending))
+        block_ids.append(block_id)
+
+    for chunk in byte_chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        total += len(chunk)
+        if pending_size >= EXPORT_BLOCK_BYTES:
+            stage()
+            pending, pending_size = [], 0
+    if pending or not block_ids:
+        stage()
+
+    with _storage_slot():
+        if etag is None:
+            blob_client.commit_block_list(
+                [BlobBlock(block_id=block_id) for block_id in block_ids],
+                content_settings=ContentSettings(content_type=content_type)
+            )
+        else:
+            blob_client.commit_block_list(
+                [BlobBlock(block_id=block_id) for block_id in block_ids],
+                content_settings=ContentSettings(content_type=content_type),
+                etag=etag, match_condition=MatchConditions.IfNotModified
+            )
+    return total
+
+
+def _blob_sas_url(container: str, blob_name: str, download_name: str, minutes: int):
+    """Short-lived read-only SAS URL, served by Storage (range requests included)."""
+    sas = generate_blob_sas(
+        account_name=blob_service_client.account_name,
+        container_name=container,
+        blob_name=blob_name,
+        account_key=blob_service_client.credential.account_key,
+        permission=BlobSasPermissions(read=True),
+        expiry=datetime.now(timezone.utc) + timedelta(minutes=minutes),
+        content_disposition=f'attachment; filename="{download_name}"'
+    )
+    blob_client = blob_service_client.get_blob_client(container, blob_name)
+    return f"{blob_client.url}?{sas}"
+
+
+class _ZipSink(io.RawIOBase):
+    """Unseekable write target for zipfile; the written bytes are drained as chunks."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+def _download_to_spool(container: str, blob_name: str):
+    """Download a blob into a spooled temp file (memory first, disk for large files)."""
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_BYTES)
+    blob_client = blob_service_client.get_blob_client(container, blob_name)
+    with _storage_slot():
+        blob_client.download_blob().readinto(spool)
+    spool.seek(0)
+    return spool
+
+
+def _zip_path_segment(value, fallback: str):
+    """
+    One ZIP path segment from user input: separators ("/", "\\", ":") and
+    control characters become "_", leading dots and spaces are dropped, so
+    "..", absolute and drive paths cannot escape the extraction folder.
+    """
+    segment = re.sub(r'[\x00-\x1f\x7f/\\:]', "_", str(value or "")).lstrip(". ")
+    return segment or fallback
+
+
+def _bundle_entry_name(doc: dict, used: set):
+    """Unique, path-safe ZIP entry name: <employee>/<file name>."""
+    folder = _zip_path_segment(doc.get("employee_name") or doc.get("employee_id"), "unknown")
+    file_name = _zip_path_segment(doc.get("file_name") or doc.get("id"), "document")
+    name = f"{folder}/{file_name}"
+    stem, ext = os.path.splitext(name)
+    counter = 1
+    while name in used:
+        counter += 1
+        name = f"{stem} ({counter}){ext}"
+    used.add(name)
+    return name
+
+
+def _iter_zip_chunks(documents: list, skipped: list):
+    """
+    Yield a ZIP archive of the documents' blobs as byte chunks. Up to
+    BUNDLE_CONCURRENCY blobs are downloaded ahead in parallel (spooled,
+    not held in memory) while earlier ones are compressed in order.
+    Documents whose blob has disappeared (purged since the listing) are
+    left out and their ids appended to `skipped`.
+    """
+    sink = _ZipSink()
+    used_names = set()
+
+    with ThreadPoolExecutor(max_workers=BUNDLE_CONCURRENCY) as pool:
+        pending = [
+            pool.submit(_download_to_spool, DOCUMENTS_CONTAINER, doc["blob_name"])
+            for doc in documents[:BUNDLE_CONCURRENCY]
+        ]
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for position, doc in enumerate(documents):
+                next_position = position + BUNDLE_CONCURRENCY
+                if next_position < len(documents):
+                    pending.append(pool.submit(
+                        _download_to_spool, DOCUMENTS_CONTAINER, documents[next_position]["blob_name"]
+                    ))
+                try:
+                    spool = pending[position].result()
+                except ResourceNotFoundError:
+                    logging.warning("Bundle: %s is gone, skipping document %s", doc["blob_name"], doc["id"])
+                    skipped.append(doc["id"])
+                    pending[position] = None
+                    continue
+
+                large = (doc.get("file_size") or 0) >= zipfile.ZIP64_LIMIT
+                with spool, archive.open(_bundle_entry_name(doc, used_names), "w", force_zip64=large) as entry:
+                    for piece in iter(lambda: spool.read(UPLOAD_CHUNK_BYTES), b""):
+                        entry.write(piece)
+                        yield from sink.drain()
+                pending[position] = None
+                yield from sink.drain()
+    yield from sink.drain()
+
+
+def _redirect_or_link(req: func.HttpRequest, url: str, extra: dict):
+    """302 to a download URL, or JSON with the URL when ?redirect=false."""
+    if (req.params.get("redirect") or "").lower() == "false":
+        return _json_response(dict(extra, url=url))
+    return func.HttpResponse(status_code=302, headers={"Location": url})
 
 
 def _utc_now_iso():
@@ -57,15 +565,1186 @@ def _find_by_id(items: list, item_id: str):
     return None, None
 
 
-def _json_response(body, status_code=200):
+def _write_tombstone(entity: str, item_id: str):
+    """
+    Soft-delete: write tombstones/{entity}/{id} instead of rewriting the collection.
+    Returns False if the item was already tombstoned.
+    """
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    blob_client = container_client.get_blob_client(f"tombstones/{entity}/{item_id}")
+    try:
+        with _storage_slot():
+            blob_client.upload_blob(
+                json.dumps({"id": item_id, "deleted_at": _utc_now_iso()}).encode("utf-8"),
+                overwrite=False
+            )
+    except ResourceExistsError:
+        return False
+    # Deleted employees / tasks must drop out of ?expand= and name lookups now
+    _summary_cache.pop(f"{entity}/{entity}.json", None)
+    return True
+
+
+def _is_tombstoned(entity: str, item_id: str):
+    """True if the item was soft-deleted and not purged yet."""
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    with _storage_slot():
+        return container_client.get_blob_client(f"tombstones/{entity}/{item_id}").exists()
+
+
+def _get_tombstoned_ids(entity: str):
+    """Ids of all soft-deleted items of an entity (kept small by the purger)."""
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    prefix = f"tombstones/{entity}/"
+    with _storage_slot():
+        return {name[len(prefix):] for name in container_client.list_blob_names(name_starts_with=prefix)}
+
+
+def _record_exists(entity: str, item_id: str):
+    """
+    Cheap existence check for DELETE, against the cached id -> summary map of
+    the hot collection. A miss reloads the map at most every
+    SUMMARY_MISS_REFRESH_SECONDS, so unknown ids cannot force a download each.
+    Tasks / reminders missing from the hot set may be archived; partitions are
+    not searched: while any exist the tombstone is written anyway and the
+    purger drops tombstones that match no record.
+    """
+    blob_path = f"{entity}/{entity}.json"
+    if item_id in _get_summaries(blob_path):
+        return True
+    if item_id in _get_summaries(blob_path, max_age=SUMMARY_MISS_REFRESH_SECONDS):
+        return True
+    if entity not in ("tasks", "reminders"):
+        return False
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    return bool(_list_blob_names(container_client, f"{entity}/archive/"))
+
+
+def _without_tombstones(entity: str, items: list):
+    """Hide soft-deleted items from a collection read."""
+    deleted = _get_tombstoned_ids(entity)
+    if not deleted:
+        return items
+    return [item for item in items if item.get("id") not in deleted]
+
+
+def _delete_blobs_in_batches(container_client, blob_names: list):
+    """
+    Delete blobs with Blob batch requests; missing blobs are ignored.
+    Entries may also be dicts ({"name", "etag", "match_condition"}) for
+    conditional deletes; those that no longer match are skipped.
+    """
+    blob_names = list(blob_names)
+    for start in range(0, len(blob_names), BLOB_BATCH_SIZE):
+        with _storage_slot():
+            container_client.delete_blobs(
+                *blob_names[start:start + BLOB_BATCH_SIZE],
+                raise_on_any_failure=False
+            )
+
+
+def _get_archive_partitions(entity: str):
+    """
+    Read every {entity}/archive/YYYY-MM.json.gz partition concurrently.
+    Returns {blob_path: [items]}.
+    """
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    names = _list_blob_names(container_client, f"{entity}/archive/")
+
+    def read(name):
+        with _storage_slot():
+            data = container_client.get_blob_client(name).download_blob().readall()
+        return json.loads(gzip.decompress(data).decode("utf-8"))
+
+    if not names:
+        return {}
+    with ThreadPoolExecutor(max_workers=ARCHIVE_READ_CONCURRENCY) as pool:
+        return dict(zip(names, pool.map(read, names)))
+
+
+def _archive_partition_tier(blob_path: str):
+    """
+    Tier to write a partition with: ARCHIVE_BLOB_TIER once its month can no
+    longer receive items, otherwise None (account default, Hot). The month
+    still being filled is rewritten daily; on Cool every rewrite would be an
+    early deletion.
+    """
+    if not ARCHIVE_BLOB_TIER:
+        return None
+    entity = blob_path.split("/", 1)[0]
+    days = ARCHIVE_COMPLETED_AFTER_DAYS if entity == "tasks" else ARCHIVE_REMINDERS_AFTER_DAYS
+    open_from = (datetime.utcnow() - timedelta(days=days + 1)).strftime("%Y-%m")
+    month = blob_path.rsplit("/", 1)[-1][:7]
+    return ARCHIVE_BLOB_TIER if month < open_from else None
+
+
+def _tier_closed_partitions(entity: str):
+    """Move partitions whose month has closed to ARCHIVE_BLOB_TIER (a tier change, no rewrite)."""
+    if not ARCHIVE_BLOB_TIER:
+        return 0
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    moved = 0
+    for blob in _list_blobs(container_client, f"{entity}/archive/"):
+        tier = _archive_partition_tier(blob.name)
+        if tier and blob.blob_tier != tier:
+            with _storage_slot():
+                container_client.get_blob_client(blob.name).set_standard_blob_tier(tier)
+            moved += 1
+    return moved
+
+
+def _update_archive_partition(blob_path: str, mutate):
+    """
+    ETag-conditional read-modify-write of one archive partition, retried on
+    a concurrent write. mutate(items) gets the current items ([] when the
+    partition does not exist) and returns the new list, or None to skip.
+    """
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    blob_client = container_client.get_blob_client(blob_path)
+
+    for _ in range(CONDITIONAL_WRITE_RETRIES):
+        try:
+            with _storage_slot():
+                downloader = blob_client.download_blob()
+                data = downloader.readall()
+            items = json.loads(gzip.decompress(data).decode("utf-8"))
+            etag = downloader.properties.etag
+        except ResourceNotFoundError:
+            items, etag = [], None
+
+        new_items = mutate(items)
+        if new_items is None:
+            return
+        data = gzip.compress(json.dumps(new_items).encode("utf-8"))
+        tier = _archive_partition_tier(blob_path)
+        try:
+            with _storage_slot():
+                if etag is None:
+                    blob_client.upload_blob(data, overwrite=False, standard_blob_tier=tier)
+                else:
+                    blob_client.upload_blob(
+                        data, overwrite=True, standard_blob_tier=tier,
+                        etag=etag, match_condition=MatchConditions.IfNotModified
+                    )
+            return
+        except (ResourceModifiedError, ResourceExistsError):
+            continue
+
+    raise RuntimeError(f"Could not update {blob_path}: too many concurrent writers")
+
+
+def _iter_archived_records(entity: str):
+    """
+    Yield the archived items of an entity partition by partition, oldest
+    month first, so memory is bounded by one partition. Tombstones are not
+    applied.
+    """
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    for name in sorted(_list_blob_names(container_client, f"{entity}/archive/")):
+        with _storage_slot():
+            data = container_client.get_blob_client(name).download_blob().readall()
+        yield from json.loads(gzip.decompress(data).decode("utf-8"))
+
+
+def _get_archived(entity: str):
+    """All archived items of an entity, tombstoned ones hidden."""
+    items = []
+    for partition in _get_archive_partitions(entity).values():
+        items.extend(partition)
+    return _without_tombstones(entity, items)
+
+
+def _include_archived(req: func.HttpRequest):
+    """True when ?include_archived=true was passed."""
+    return (req.params.get("include_archived") or "").lower() in ("1", "true", "yes")
+
+
+def _archive_items(entity: str, partition_key, is_archivable):
+    """
+    Move hot items matching is_archivable into {entity}/archive/<partition_key(item)>.json.gz.
+    Partitions are written before the hot collection is shrunk, so a crash
+    in between only leaves duplicates (merged by id on the next run).
+    All writes are ETag-conditional. An item changed while the job runs
+    stays hot, and its copy is taken out of the partition again.
+    Returns the number of archived items.
+    """
+    blob_path = f"{entity}/{entity}.json"
+    items = _get_blob_json(blob_path)
+    deleted = _get_tombstoned_ids(entity)
+
+    by_partition = {}
+    for item in items:
+        if item.get("id") in deleted or not is_archivable(item):
+            continue
+        key = partition_key(item)
+        if key:
+            by_partition.setdefault(f"{entity}/archive/{key}.json.gz", []).append(item)
+
+    if not by_partition:
+        return 0
+
+    now = _utc_now_iso()
+    for partition_path, new_items in by_partition.items():
+        def merge(existing, new_items=new_items):
+            merged = {item["id"]: item for item in existing}
+            for item in new_items:
+                merged[item["id"]] = dict(item, archived_at=now)
+            return list(merged.values())
+
+        _update_archive_partition(partition_path, merge)
+
+    candidates = {item["id"]: item for new_items in by_partition.values() for item in new_items}
+
+    def shrink(current):
+        # Only drop items still exactly as they were archived
+        current = current or []
+        archived = [item for item in current if candidates.get(item.get("id")) == item]
+        if not archived:
+            return None, archived
+        archived_ids = {item["id"] for item in archived}
+        return [item for item in current if item.get("id") not in archived_ids], archived
+
+    archived = _update_blob_json(blob_path, shrink)
+
+    archived_ids = {item["id"] for item in archived}
+    stale_ids = set(candidates) - archived_ids
+    if stale_ids:
+        for partition_path, new_items in by_partition.items():
+            if any(item["id"] in stale_ids for item in new_items):
+                _update_archive_partition(
+                    partition_path,
+                    lambda existing: [item for item in existing if item.get("id") not in stale_ids]
+                )
+
+    _record_changes(entity, "archive", archived)
+    return len(archived)
+
+
+def _email_index_path(email: str):
+    """Index blob for an email: employees/email-index/<sha256 of normalized email>.json"""
+    digest = hashlib.sha256(email.strip().lower().encode("utf-8")).hexdigest()
+    return f"employees/email-index/{digest}.json"
+
+
+EMPLOYEE_ROLES = ("admin", "manager", "employee")
+
+
+def _role_for_position(position: str):
+    """
+    Default role for a new employee, by position title (the rule the SPA used).
+    The result is stored in the employee's own "role" field; later position
+    changes do not change it.
+    """
+    position = (position or "").lower()
+    if "admin" in position:
+        return "admin"
+    if "manager" in position:
+        return "manager"
+    return "employee"
+
+
+def _employee_role(employee: dict):
+    """Stored role; records from before roles were stored fall back to the position rule."""
+    return employee.get("role") or _role_for_position(employee.get("position"))
+
+
+def _email_identity(employee: dict):
+    """Compact identity record stored in the email index (everything login needs)."""
+    return {
+        "id": employee["id"],
+        "name": employee.get("name"),
+        "position": employee.get("position"),
+        "department": employee.get("department"),
+        "role": _employee_role(employee),
+    }
+
+
+def _set_email_index(employee: dict):
+    """Point the employee's email at its identity record."""
+    _set_blob_json(_email_index_path(employee["email"]), _email_identity(employee))
+
+
+def _claim_email(employee: dict):
+    """
+    Point the employee's email at it unless another live employee owns the
+    email. Create-if-absent / ETag-conditional, so of two concurrent claims
+    only one wins; entries of tombstoned employees may be taken over.
+    Returns False when the email is taken.
+    """
+    def claim(identity):
+        if identity and identity.get("id") != employee["id"] and not _is_tombstoned("employees", identity["id"]):
+            return None, False
+        return _email_identity(employee), True
+
+    return _update_blob_json(_email_index_path(employee["email"]), claim)
+
+
+def _backfill_email_index(employee: dict):
+    """Create a missing index entry; never replaces one. Returns True if written."""
+    try:
+        _set_blob_json_if_unchanged(_email_index_path(employee["email"]), _email_identity(employee), None)
+        return True
+    except ResourceExistsError:
+        return False
+
+
+def _delete_email_index(email: str, employee_id: str):
+    """Remove an email's index entry if it still points at employee_id."""
+    blob_path = _email_index_path(email)
+    identity, etag = _get_blob_json_for_update(blob_path)
+    if identity and identity.get("id") == employee_id:
+        container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+        try:
+            with _storage_slot():
+                container_client.get_blob_client(blob_path).delete_blob(
+                    etag=etag, match_condition=MatchConditions.IfNotModified
+                )
+        except (ResourceModifiedError, ResourceNotFoundError):
+            pass  # claimed by another employee meanwhile
+        _invalidate_blob_json(blob_path)
+
+
+def _b64url(data: bytes):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64url_decode(text: str):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _issue_token(identity: dict):
+    """Compact HMAC-SHA256 signed token: base64url(claims).base64url(signature)."""
+    claims = {
+        "sub": identity["id"],
+        "name": identity.get("name"),
+        "role": identity.get("role"),
+        "exp": int(time.time()) + SESSION_TTL_HOURS * 3600,
+    }
+    payload = _b64url(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    signature = hmac.new(SESSION_SECRET.encode("utf-8"), payload.encode("ascii"), hashlib.sha256).digest()
+    return f"{payload}.{_b64url(signature)}"
+
+
+def _verify_token(token: str):
+    """Return the token's claims, or None if it is malformed, forged or expired."""
+    if not SESSION_SECRET or not token or "." not in token:
+        return None
+    payload, _, signature = token.partition(".")
+    try:
+        # Non-ASCII input raises UnicodeEncodeError, a ValueError
+        expected = hmac.new(SESSION_SECRET.encode("utf-8"), payload.encode("ascii"), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64url_decode(signature)):
+            return None
+        claims = json.loads(_b64url_decode(payload))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict):
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+
+def _get_session(req: func.HttpRequest):
+    """Claims of the Bearer token on the request, or None."""
+    auth_header = req.headers.get("Authorization") or ""
+    if not auth_header.startswith("Bearer "):
+        return None
+    return _verify_token(auth_header[len("Bearer "):].strip())
+
+
+def _caller_is_admin(req: func.HttpRequest):
+    """True when the caller may grant admin rights (anyone while AUTH_REQUIRED is off)."""
+    if not AUTH_REQUIRED:
+        return True
+    return (_get_session(req) or {}).get("role") == "admin"
+
+
+def _authorize(req: func.HttpRequest, roles: tuple):
+    """
+    Return an error response when AUTH_REQUIRED is on and the caller's token
+    is missing, invalid or lacks one of `roles`; None when the call may proceed.
+    """
+    if not AUTH_REQUIRED:
+        return None
+    session = _get_session(req)
+    if not session:
+        return _json_response({"error": "Authentication required"}, 401)
+    if session.get("role") not in roles:
+        return _json_response({"error": "Forbidden"}, 403)
+    return None
+
+
+def _idempotency_path(req: func.HttpRequest, scope: str):
+    """Blob path for the request's Idempotency-Key header, or None when absent."""
+    key = (req.headers.get("Idempotency-Key") or "").strip()
+    if not key:
+        return None
+    digest = hashlib.sha256(f"{scope}:{key}".encode("utf-8")).hexdigest()
+    return f"idempotency/{digest}.json"
+
+
+def _request_fingerprint(req: func.HttpRequest, fingerprint=None):
+    """What "the same request" means for a key: the raw body unless the handler passes its own."""
+    return fingerprint or hashlib.sha256(req.get_body()).hexdigest()
+
+
+def _idempotent_replay(req: func.HttpRequest, scope: str, fingerprint=None):
+    """
+    Check the Idempotency-Key of a POST before doing any work.
+    Returns the stored response of an earlier identical request (memory
+    first, then blob), a 409/422 error response, or None to proceed.
+    `fingerprint` replaces the raw-body hash for requests whose bytes differ
+    between retries (multipart boundaries); pass the same value to
+    _remember_idempotent.
+    When None is returned for a keyed request, the key is claimed and must
+    be released with _release_idempotency_key.
+    """
+    blob_path = _idempotency_path(req, scope)
+    if not blob_path:
+        return None
+
+    with _idempotency_lock:
+        record = _idempotency_memory.get(blob_path)
+    if record is None:
+        try:
+            record = _get_blob_json(blob_path)
+        except ResourceNotFoundError:
+            record = None
+    if record is not None and record["expires_at"] < time.time():
+        record = None
+
+    if record is not None:
+        if record["request_hash"] != _request_fingerprint(req, fingerprint):
+            return _json_response(
+                {"error": "Idempotency-Key was already used with a different request body"}, 422
+            )
+        return _json_response(record["body"], record["status_code"],
+                              headers={"Idempotent-Replayed": "true"})
+
+    with _idempotency_lock:
+        if blob_path in _idempotency_inflight:
+            return _json_response(
+                {"error": "A request with this Idempotency-Key is still in progress"}, 409
+            )
+        _idempotency_inflight[blob_path] = id(req)
+    return None
+
+
+def _remember_idempotent(req: func.HttpRequest, scope: str, body, status_code: int, fingerprint=None):
+    """Store a successful response under the request's Idempotency-Key (no-op without one)."""
+    blob_path = _idempotency_path(req, scope)
+    if not blob_path:
+        return
+
+    record = {
+        "status_code": status_code,
+        "body": body,
+        "request_hash": _request_fingerprint(req, fingerprint),
+        "expires_at": time.time() + IDEMPOTENCY_TTL_HOURS * 3600,
+    }
+    _set_blob_json(blob_path, record)
+    with _idempotency_lock:
+        _idempotency_memory[blob_path] = record
+        while len(_idempotency_memory) > IDEMPOTENCY_MEMORY_LIMIT:
+            del _idempotency_memory[next(iter(_idempotency_memory))]
+
+
+def _run_follow_ups(handler: str, *steps):
+    """
+    Run the steps that follow a create's collection write. The record
+    exists at that point, so a failing step is logged rather than turned
+    into an error response that would make the client retry (and create
+    a duplicate).
+    """
+    for step in steps:
+        try:
+            step()
+        except Exception:
+            logging.exception(f"Follow-up step failed in {handler}")
+
+
+def _release_idempotency_key(req: func.HttpRequest, scope: str):
+    """Release the key claimed by this request, letting later retries through."""
+    blob_path = _idempotency_path(req, scope)
+    if blob_path:
+        with _idempotency_lock:
+            if _idempotency_inflight.get(blob_path) == id(req):
+                del _idempotency_inflight[blob_path]
+
+
+def _hash_upload(stream):
+    """
+    Copy an upload into a spooled temp file (memory up to UPLOAD_SPOOL_MAX_BYTES,
+    then disk) while computing its SHA-256. Returns (hex digest, size, spool).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_BYTES)
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+        spool.write(chunk)
+    spool.seek(0)
+    return digest.hexdigest(), size, spool
+
+
+def _add_content_reference(blob_name: str, data, length: int, mime_type: str):
+    """
+    Store content once under its content-addressed name, or bump the
+    "refcount" metadata if it is already there. Metadata updates are
+    conditional on the ETag, so concurrent uploads cannot lose a count.
+    Returns (uploaded, metadata): uploaded is False when deduplicated, and
+    metadata carries what the processing worker recorded on the content.
+    """
+    docs_container = blob_service_client.get_container_client(DOCUMENTS_CONTAINER)
+    blob_client = docs_container.get_blob_client(blob_name)
+
+    for _ in range(CONTENT_REF_RETRIES):
+        try:
+            with _storage_slot():
+                props = blob_client.get_blob_properties()
+        except ResourceNotFoundError:
+            try:
+                with _storage_slot():
+                    blob_client.upload_blob(
+                        data,
+                        length=length,
+                        overwrite=False,
+                        metadata={"refcount": "1"},
+                        content_settings=ContentSettings(content_type=mime_type)
+                    )
+                return True, {"refcount": "1"}
+            except ResourceExistsError:
+                data.seek(0)  # uploaded concurrently; count a reference instead
+                continue
+
+        metadata = dict(props.metadata)
+        metadata["refcount"] = str(int(metadata.get("refcount", "1")) + 1)
+        try:
+            with _storage_slot():
+                blob_client.set_blob_metadata(
+                    metadata, etag=props.etag, match_condition=MatchConditions.IfNotModified
+                )
+            return False, metadata
+        except (ResourceModifiedError, ResourceNotFoundError):
+            continue
+
+    raise RuntimeError(f"Could not add a reference to {blob_name}")
+
+
+def _release_content_reference(blob_name: str, count: int = 1):
+    """Drop `count` references; the blob is deleted when the last one goes."""
+    docs_container = blob_service_client.get_container_client(DOCUMENTS_CONTAINER)
+    blob_client = docs_container.get_blob_client(blob_name)
+
+    for _ in range(CONTENT_REF_RETRIES):
+        try:
+            with _storage_slot():
+                props = blob_client.get_blob_properties()
+        except ResourceNotFoundError:
+            return
+
+        remaining = int(props.metadata.get("refcount", "1")) - count
+        try:
+            with _storage_slot():
+                if remaining <= 0:
+                    blob_client.delete_blob(etag=props.etag, match_condition=MatchConditions.IfNotModified)
+                else:
+                    metadata = dict(props.metadata, refcount=str(remaining))
+                    blob_client.set_blob_metadata(
+                        metadata, etag=props.etag, match_condition=MatchConditions.IfNotModified
+                    )
+        except ResourceModifiedError:
+            continue
+
+        if remaining <= 0:
+            # Text / thumbnail derived from this content go with it
+            derived = _list_blob_names(docs_container, _derived_prefix(blob_name))
+            _delete_blobs_in_batches(docs_container, derived)
+        return
+
+    raise RuntimeError(f"Could not release references to {blob_name}")
+
+
+def _update_content_metadata(blob_name: str, updates: dict):
+    """
+    Merge `updates` into a content blob's metadata. ETag-conditional like the
+    refcount changes, so neither side overwrites the other's keys.
+    Returns False when the blob no longer exists.
+    """
+    docs_container = blob_service_client.get_container_client(DOCUMENTS_CONTAINER)
+    blob_client = docs_container.get_blob_client(blob_name)
+
+    for _ in range(CONTENT_REF_RETRIES):
+        try:
+            with _storage_slot():
+                props = blob_client.get_blob_properties()
+                blob_client.set_blob_metadata(
+                    dict(props.metadata, **updates),
+                    etag=props.etag, match_condition=MatchConditions.IfNotModified
+                )
+            return True
+        except ResourceNotFoundError:
+            return False
+        except ResourceModifiedError:
+            continue
+
+    raise RuntimeError(f"Could not update metadata of {blob_name}")
+
+
+def _derived_prefix(blob_name: str):
+    """content/<sha256> -> derived/<sha256>/ (text.txt, thumbnail.png)."""
+    return "derived/" + blob_name.split("/", 1)[-1] + "/"
+
+
+def _processing_fields(blob_name: str, metadata: dict):
+    """Document record fields for the processing state stored on the content blob."""
+    status = metadata.get("processed")
+    if status == "failed":
+        return {"processing_status": "failed"}
+    if status != "true":
+        return {"processing_status": "pending"}
+
+    prefix = _derived_prefix(blob_name)
+    page_count = metadata.get("page_count")
+    return {
+        "processing_status": "processed",
+        "page_count": int(page_count) if page_count else None,
+        "text_blob": prefix + "text.txt" if metadata.get("has_text") == "true" else None,
+        "thumbnail_blob": prefix + "thumbnail.png" if metadata.get("has_thumbnail") == "true" else None,
+    }
+
+
+def _get_process_pool():
+    """Process pool for document_processing; spawned lazily so HTTP-only workers never pay for it."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=DOCUMENT_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def _discard_process_pool(pool, kill: bool = False):
+    """
+    Drop a broken or stuck pool so the next _get_process_pool() spawns a
+    fresh one. kill=True also kills its workers: shutdown() alone leaves a
+    hung parser running (and holding its memory) forever. Work in flight on
+    the other workers fails with BrokenProcessPool and is retried.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    # shutdown() forgets the processes, so collect them first
+    processes = list((pool._processes or {}).values()) if kill else []
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.kill()
+
+
+def _derive_content(blob_name: str, mime_type: str):
+    """
+    Download a content blob to a temp file, extract text / page count /
+    thumbnail in the process pool and upload them under derived/<sha256>/.
+    Returns the metadata to record on the content blob.
+    """
+    docs_container = blob_service_client.get_container_client(DOCUMENTS_CONTAINER)
+    prefix = _derived_prefix(blob_name)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "content")
+        with open(path, "wb") as f, _storage_slot():
+            docs_container.get_blob_client(blob_name).download_blob().readinto(f)
+
+        pool = _get_process_pool()
+        try:
+            try:
+                derived = pool.submit(document_processing.extract_derived, path, mime_type).result(
+                    timeout=DOCUMENT_PROCESS_TIMEOUT_SECONDS
+                )
+            except BrokenProcessPool:
+                # A worker died (crash or OOM in a parser); the executor refuses
+                # all work from then on, so replace it and try once more
+                logging.warning("Document process pool broke while processing %s, recreating it", blob_name)
+                _discard_process_pool(pool)
+                pool = _get_process_pool()
+                derived = pool.submit(document_processing.extract_derived, path, mime_type).result(
+                    timeout=DOCUMENT_PROCESS_TIMEOUT_SECONDS
+                )
+        except FutureTimeoutError:
+            # A parser hung: kill it, and let the queue redeliver the message
+            # (process_document marks the content failed after the last attempt)
+            logging.warning(
+                "Processing %s took over %ss, killing the document process pool",
+                blob_name, DOCUMENT_PROCESS_TIMEOUT_SECONDS
+            )
+            _discard_process_pool(pool, kill=True)
+            raise
+
+    if derived["text"]:
+        with _storage_slot():
+            docs_container.get_blob_client(prefix + "text.txt").upload_blob(
+                derived["text"].encode("utf-8"), overwrite=True,
+                content_settings=ContentSettings(content_type="text/plain; charset=utf-8")
+            )
+    if derived["thumbnail"]:
+        with _storage_slot():
+            docs_container.get_blob_client(prefix + "thumbnail.png").upload_blob(
+                derived["thumbnail"], overwrite=True,
+                content_settings=ContentSettings(content_type="image/png")
+            )
+
+    metadata = {
+        "processed": "true",
+        "has_text": "true" if derived["text"] else "false",
+        "has_thumbnail": "true" if derived["thumbnail"] else "false",
+    }
+    if derived["page_count"] is not None:
+        metadata["page_count"] = str(derived["page_count"])
+    return metadata
+
+
+def _apply_processing_fields(blob_name: str, fields: dict):
+    """
+    Copy processing results onto every document record sharing this content.
+    Conditional on the collection's ETag, so uploads and edits that land
+    meanwhile are re-read rather than overwritten.
+    """
+    def apply(documents):
+        changed = []
+        for doc in documents or []:
+            if doc.get("blob_name") != blob_name:
+                continue
+            if all(doc.get(key) == value for key, value in fields.items()):
+                continue
+            doc.update(fields)
+            doc["updated_at"] = _utc_now_iso()
+            changed.append(doc)
+        return (documents if changed else None), changed
+
+    changed = _update_blob_json("documents/documents.json", apply)
+    if changed:
+        _record_changes("documents", "upsert", changed)
+    return len(changed)
+
+
+def _catch_up_processing(blob_name: str):
+    """Copy results the worker has already recorded on the content onto its document records."""
+    docs_container = blob_service_client.get_container_client(DOCUMENTS_CONTAINER)
+    try:
+        with _storage_slot():
+            props = docs_container.get_blob_client(blob_name).get_blob_properties()
+    except ResourceNotFoundError:
+        return 0
+    fields = _processing_fields(blob_name, dict(props.metadata))
+    if fields["processing_status"] == "pending":
+        return 0
+    return _apply_processing_fields(blob_name, fields)
+
+
+def _get_change_log(entity: str):
+    """Read {entity}/changes.json. A missing log means version 0, no entries."""
+    try:
+        log = _get_blob_json(f"{entity}/changes.json")
+    except ResourceNotFoundError:
+        log = None
+    if not isinstance(log, dict):
+        log = {"version": 0, "entries": []}
+    return log
+
+
+def _record_changes(entity: str, op: str, items: list, skipped: int = 0, previous_owners: dict = None):
+    """
+    Append one change entry per item to {entity}/changes.json.
+    op is "upsert" (item body included), "delete" (tombstone, id only) or
+    "archive" (moved out of the hot collection, id only).
+    Each entry gets the next collection version; only the newest
+    CHANGE_LOG_LIMIT entries are kept. `skipped` counts changes made before
+    `items` that were not kept in memory (bulk imports): their versions are
+    reserved, so replicas older than them get a 410 and reload.
+    `previous_owners` maps ids of reassigned items to their old employee_id,
+    so the previous assignee's subscription sees the item leave.
+    """
+    previous_owners = previous_owners or {}
+    if not items and not skipped:
+        return
+
+    now = _utc_now_iso()
+
+    def append(log):
+        # Conditional write: concurrent writers must not reuse a version or drop an entry
+        if not isinstance(log, dict):
+            log = {"version": 0, "entries": []}
+        version = log["version"]
+        if skipped:
+            version += skipped
+            log["entries"] = []
+
+        for item in items:
+            version += 1
+            entry = {"version": version, "op": op, "id": item.get("id")}
+            if op == "archive":
+                entry["archived_at"] = now
+            elif op == "delete":
+                entry["deleted_at"] = now
+                if "employee_id" in item:
+                    entry["employee_id"] = item.get("employee_id")
+            else:
+                entry["item"] = item
+                entry["updated_at"] = item.get("updated_at", now)
+                previous = previous_owners.get(item.get("id"))
+                if previous and previous != item.get("employee_id"):
+                    entry["previous_employee_id"] = previous
+            log["entries"].append(entry)
+
+        log["version"] = version
+        log["entries"] = log["entries"][-CHANGE_LOG_LIMIT:]
+        return log, None
+
+    _update_blob_json(f"{entity}/changes.json", append)
+    _publish_changes(entity, items, previous_owners)
+
+
+def _record_change(entity: str, op: str, item: dict, previous_employee_id: str = None):
+    """Single-item shorthand for _record_changes."""
+    previous_owners = {item.get("id"): previous_employee_id} if previous_employee_id else None
+    _record_changes(entity, op, [item], previous_owners=previous_owners)
+
+
+def _record_created(entity: str, item: dict):
+    """
+    Change-log a create that is already written. If the entry cannot be
+    appended, reserve a version without it instead: every replica is then
+    behind the log's window and gets a 410 to reload, rather than never
+    seeing the record.
+    """
+    try:
+        _record_change(entity, "upsert", item)
+    except Exception:
+        logging.exception("Could not log the creation of %s %s, forcing replicas to reload", entity, item.get("id"))
+        _record_changes(entity, "upsert", [], skipped=1)
+
+
+def _publish_changes(entity: str, items: list, previous_owners: dict = None):
+    """Wake local subscribers waiting on this entity."""
+    global _publish_seq
+    previous_owners = previous_owners or {}
+    with _publish_lock:
+        for item in items:
+            _publish_seq += 1
+            owners = {item.get("employee_id"), previous_owners.get(item.get("id"))} - {None}
+            _published_changes.append((_publish_seq, entity, owners))
+        del _published_changes[:-CHANGE_LOG_LIMIT]
+        waiters = list(_change_waiters)
+
+    for loop, event in waiters:
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(event.set)
+
+
+def _entry_employee_ids(entry: dict):
+    """
+    employee_ids a change entry concerns (upserts carry the item, deletes the
+    id); a reassignment concerns the previous assignee as well. Empty when unknown.
+    """
+    owner = entry["item"].get("employee_id") if "item" in entry else entry.get("employee_id")
+    return {owner, entry.get("previous_employee_id")} - {None}
+
+
+def _parse_cursor(raw: str):
+    """Parse a subscription cursor like "tasks:12,reminders:4" into a dict."""
+    cursor = {}
+    for part in (raw or "").split(","):
+        entity, _, version = part.partition(":")
+        if entity.strip() in SUBSCRIBE_ENTITIES and version.strip().isdigit():
+            cursor[entity.strip()] = int(version)
+    return cursor
+
+
+def _format_cursor(cursor: dict):
+    return ",".join(f"{entity}:{cursor[entity]}" for entity in SUBSCRIBE_ENTITIES if entity in cursor)
+
+
+def _collect_events(cursor: dict, employee_id):
+    """
+    Read the change logs and return (events, cursor) for everything after
+    `cursor`, filtered to employee_id when given. Advances the cursor even
+    when the entries are not relevant, so they are not re-scanned.
+    """
+    events = []
+    logs = {entity: _get_change_log(entity) for entity in SUBSCRIBE_ENTITIES}
+    # Entities the cursor does not name start at their current version, so
+    # every cursor handed out covers all of them
+    cursor = {entity: cursor.get(entity, log["version"]) for entity, log in logs.items()}
+    for entity, log in logs.items():
+        since = cursor[entity]
+        entries = log["entries"]
+        oldest = entries[0]["version"] if entries else log["version"] + 1
+
+        if since < oldest - 1 or since > log["version"]:
+            # Too far behind (or log reset): the client has to reload
+            cursor[entity] = log["version"]
+            events.append({"entity": entity, "op": "reset", "cursor": _format_cursor(cursor)})
+            continue
+
+        for entry in entries:
+            if entry["version"] <= since:
+                continue
+            cursor[entity] = entry["version"]
+            owners = _entry_employee_ids(entry)
+            if employee_id and owners and employee_id not in owners:
+                continue
+            events.append(dict(entry, entity=entity, cursor=_format_cursor(cursor)))
+        cursor[entity] = log["version"]
+    return events, cursor
+
+
+async def _wait_for_local_change(after_seq: int, employee_id, timeout: float):
+    """
+    Wait (without holding a thread) until this worker publishes a relevant
+    change after `after_seq` or `timeout` passes. Returns the latest seen
+    sequence number.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        event = asyncio.Event()
+        waiter = (loop, event)
+        with _publish_lock:
+            for seq, entity, owners in _published_changes:
+                if seq > after_seq and (not employee_id or not owners or employee_id in owners):
+                    return _publish_seq
+            after_seq = _publish_seq
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return after_seq
+            _change_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), remaining)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with _publish_lock:
+                _change_waiters.discard(waiter)
+
+
+def _changes_response(req: func.HttpRequest, entity: str):
+    """
+    Shared body of GET /api/{entity}/changes?since=<version>.
+    Without `since` only the current version is returned, so a client can
+    take it before loading the full list and then sync from there.
+    Returns 410 when `since` is older than the retained log (full reload needed).
+    """
+    log = _get_change_log(entity)
+    version = log["version"]
+
+    raw_since = req.params.get("since")
+    if raw_since is None:
+        return _json_response({"version": version, "changes": []})
+
+    try:
+        since = int(raw_since)
+    except ValueError:
+        return _json_response({"error": "since must be an integer version"}, 400)
+
+    entries = log["entries"]
+    oldest = entries[0]["version"] if entries else version + 1
+    if since < oldest - 1 or since > version:
+        return _json_response(
+            {"error": "Change log no longer covers this version, reload the collection",
+             "version": version},
+            410
+        )
+
+    # Only the latest change per id matters to a replica
+    latest = {}
+    for entry in entries:
+        if entry["version"] > since:
+            latest.pop(entry["id"], None)
+            latest[entry["id"]] = entry
+
+    return _json_response({"version": version, "changes": list(latest.values())})
+
+
+def _employee_summary(employee: dict):
+    """Compact, display-ready view of an employee."""
+    return {
+        "id": employee.get("id"),
+        "name": employee.get("name"),
+        "position": employee.get("position"),
+        "department": employee.get("department"),
+    }
+
+
+def _task_summary(task: dict):
+    """Compact, display-ready view of a task."""
+    return {
+        "id": task.get("id"),
+        "title": task.get("title"),
+        "status": task.get("status"),
+        "employee_id": task.get("employee_id"),
+    }
+
+
+def _id_summary(item: dict):
+    """Existence only, for collections nothing expands to."""
+    return {"id": item.get("id")}
+
+
+_SUMMARY_BUILDERS = {
+    "employees/employees.json": _employee_summary,
+    "tasks/tasks.json": _task_summary,
+    "reminders/reminders.json": _id_summary,
+    "documents/documents.json": _id_summary,
+}
+
+
+def _get_summaries(blob_path: str, max_age: float = None):
+    """
+    Return {id: summary} for a collection, served from a per-worker cache.
+    Entries expire after SUMMARY_CACHE_TTL_SECONDS (or `max_age`) and are
+    dropped on every write through _set_blob_json and on every tombstone write.
+    """
+    if max_age is None:
+        max_age = SUMMARY_CACHE_TTL_SECONDS
+    cached = _summary_cache.get(blob_path)
+    if cached and time.monotonic() - cached[0] < max_age:
+        return cached[1]
+
+    build = _SUMMARY_BUILDERS[blob_path]
+    items = _get_blob_json(blob_path)
+    if not isinstance(items, list):
+        items = []
+    items = _without_tombstones(blob_path.split("/")[0], items)
+
+    summaries = {item.get("id"): build(item) for item in items if isinstance(item, dict)}
+    _summary_cache[blob_path] = (time.monotonic(), summaries)
+    return summaries
+
+
+def _parse_expand(req: func.HttpRequest, allowed: set):
+    """
+    Parse ?expand=employee,task. Return (fields, error_message).
+    Only the relations in `allowed` are accepted for the endpoint.
+    """
+    raw = req.params.get("expand") or ""
+    fields = {part.strip() for part in raw.split(",") if part.strip()}
+    unknown = fields - allowed
+    if unknown:
+        return None, f"Unsupported expand value(s): {', '.join(sorted(unknown))}"
+    return fields, None
+
+
+def _expand_items(items: list, fields: set):
+    """
+    Attach employee/task summaries to each row (copies, the input is not modified).
+    Denormalized employee_name/task_name are refreshed from the summaries too.
+    """
+    if not fields:
+        return items
+
+    employees = _get_summaries("employees/employees.json") if "employee" in fields else {}
+    tasks = _get_summaries("tasks/tasks.json") if "task" in fields else {}
+
+    expanded = []
+    for item in items:
+        row = dict(item)
+        if "employee" in fields:
+            employee = employees.get(row.get("employee_id"))
+            row["employee"] = employee
+            if employee and "employee_name" in row:
+                row["employee_name"] = employee["name"]
+        if "task" in fields:
+            task = tasks.get(row.get("task_id"))
+            row["task"] = task
+            if task and "task_name" in row:
+                row["task_name"] = task["title"]
+        expanded.append(row)
+    return expanded
+
+
+def _json_response(body, status_code=200, headers=None):
     """Shorthand for JSON response."""
     return func.HttpResponse(
         body=json.dumps(body),
         mimetype="application/json",
-        status_code=status_code
+        status_code=status_code,
+        headers=headers
     )
 
 
+def _error_response(e: Exception):
+    """Map an unhandled exception to 500, or 503 + Retry-After when load was shed."""
+    if isinstance(e, StorageBusyError):
+        return _json_response(
+            {"error": str(e)}, 503,
+            headers={"Retry-After": str(STORAGE_RETRY_AFTER_SECONDS)}
+        )
+    return _json_response({"error": str(e)}, 500)
+
+
+# ========== AUTH ==========
+
+@app.route(route="auth/login", methods=["POST"])
+def login(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    POST /api/auth/login - Body {"email": ...}.
+    Resolves the user through the hashed email index (one small blob read,
+    independent of headcount) and returns a signed session token.
+    NOTE: knowing an email is all this asks for, so it identifies a user
+    but does not authenticate one. AUTH_REQUIRED=true only separates roles
+    among callers who are trusted anyway; put a real identity provider
+    (e.g. App Service Authentication) in front before exposing the API.
+    """
+    logging.info("Login called")
+    try:
+        if not SESSION_SECRET:
+            return _json_response({"error": "SESSION_SECRET not set"}, 500)
+
+        try:
+            payload = req.get_json()
+        except ValueError:
+            return _json_response({"error": "Invalid JSON body"}, 400)
+
+        email = (payload.get("email") or "").strip()
+        if not email:
+            return _json_response({"error": "email is required"}, 400)
+
+        try:
+            identity = _get_blob_json(_email_index_path(email))
+        except ResourceNotFoundError:
+            identity = None
+        if not identity or _is_tombstoned("employees", identity["id"]):
+            return _json_response({"error": "Unknown email"}, 401)
+
+        return _json_response({"token": _issue_token(identity), "user": identity})
+
+    except Exception as e:
+        logging.exception("Error in login")
+        return _error_response(e)
+
+
+@app.route(route="auth/me", methods=["GET"])
+def get_session(req: func.HttpRequest) -> func.HttpResponse:
+    """GET /api/auth/me - Claims of the caller's Bearer token (no storage read)."""
+    logging.info("GetSession called")
+    try:
+        session = _get_session(req)
+        if not session:
+            return _json_response({"error": "Invalid or expired session"}, 401)
+        return _json_response(session)
+    except Exception as e:
+        logging.exception("Error in get_session")
+        return _error_response(e)
+
+
 # ========== EMPLOYEES ==========
 
 @app.route(route="employees", methods=["GET"])
@@ -73,11 +1752,22 @@ def get_employees(req: func.HttpRequest) -> func.HttpResponse:
     """GET /api/employees - List all employees."""
     logging.info("GetEmployees called")
     try:
-        employees = _get_blob_json("employees/employees.json")
+        employees = _without_tombstones("employees", _get_blob_json("employees/employees.json"))
         return _json_response(employees)
     except Exception as e:
         logging.exception("Error in get_employees")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
+
+
+@app.route(route="employees/changes", methods=["GET"])
+def get_employee_changes(req: func.HttpRequest) -> func.HttpResponse:
+    """GET /api/employees/changes?since=<version> - Inserts, updates and deletes since a version."""
+    logging.info("GetEmployeeChanges called")
+    try:
+        return _changes_response(req, "employees")
+    except Exception as e:
+        logging.exception("Error in get_employee_changes")
+        return _error_response(e)
 
 
 @app.route(route="employees/{employee_id}", methods=["GET"])
@@ -89,20 +1779,28 @@ def get_employee(req: func.HttpRequest) -> func.HttpResponse:
         employees = _get_blob_json("employees/employees.json")
         
         item, _ = _find_by_id(employees, employee_id)
-        if not item:
+        if not item or _is_tombstoned("employees", employee_id):
             return _json_response({"error": "Employee not found"}, 404)
         
         return _json_response(item)
     except Exception as e:
         logging.exception("Error in get_employee")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
 
 
 @app.route(route="employees", methods=["POST"])
 def create_employee(req: func.HttpRequest) -> func.HttpResponse:
-    """POST /api/employees - Create a new employee."""
+    """POST /api/employees - Create a new employee. Honours an Idempotency-Key header."""
     logging.info("CreateEmployee called")
     try:
+        denied = _authorize(req, ("admin", "manager"))
+        if denied:
+            return denied
+
+        replay = _idempotent_replay(req, "employees")
+        if replay:
+            return replay
+
         try:
             payload = req.get_json()
         except ValueError:
@@ -113,14 +1811,16 @@ def create_employee(req: func.HttpRequest) -> func.HttpResponse:
         position = payload.get("position")
         department = payload.get("department")
 
-        if not all([name, email, position, department]):
+        if not all([name, email, position, department]) or not isinstance(email, str):
             return _json_response(
                 {"error": "name, email, position, department are required"}, 400
             )
 
-        employees = _get_blob_json("employees/employees.json")
-        if not isinstance(employees, list):
-            employees = []
+        role = payload.get("role") or _role_for_position(position)
+        if role not in EMPLOYEE_ROLES:
+            return _json_response({"error": f"role must be one of {', '.join(EMPLOYEE_ROLES)}"}, 400)
+        if ("role" in payload or role == "admin") and not _caller_is_admin(req):
+            return _json_response({"error": "Only admins can set roles or create admins"}, 403)
 
         now = _utc_now_iso()
         new_employee = {
@@ -129,18 +1829,32 @@ def create_employee(req: func.HttpRequest) -> func.HttpResponse:
             "email": email,
             "position": position,
             "department": department,
+            "role": role,
             "created_at": now,
             "updated_at": now
         }
 
-        employees.append(new_employee)
-        _set_blob_json("employees/employees.json", employees)
-
+        # Claim the email before the record exists, so concurrent creates
+        # with the same email cannot both succeed
+        if not _claim_email(new_employee):
+            return _json_response({"error": "An employee with this email already exists"}, 409)
+        try:
+            _append_record("employees/employees.json", new_employee)
+        except Exception:
+            _delete_email_index(email, new_employee["id"])
+            raise
+        _run_follow_ups(
+            "create_employee",
+            lambda: _remember_idempotent(req, "employees", new_employee, 201),
+            lambda: _record_created("employees", new_employee),
+        )
         return _json_response(new_employee, 201)
 
     except Exception as e:
         logging.exception("Error in create_employee")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
+    finally:
+        _release_idempotency_key(req, "employees")
 
 
 @app.route(route="employees/{employee_id}", methods=["PUT"])
@@ -148,6 +1862,10 @@ def update_employee(req: func.HttpRequest) -> func.HttpResponse:
     """PUT /api/employees/{employee_id} - Update an employee."""
     logging.info("UpdateEmployee called")
     try:
+        denied = _authorize(req, ("admin", "manager"))
+        if denied:
+            return denied
+
         employee_id = req.route_params.get("employee_id")
         try:
             payload = req.get_json()
@@ -155,91 +1873,146 @@ def update_employee(req: func.HttpRequest) -> func.HttpResponse:
             return _json_response({"error": "Invalid JSON body"}, 400)
 
         employees = _get_blob_json("employees/employees.json")
-        item, idx = _find_by_id(employees, employee_id)
+        item, _ = _find_by_id(employees, employee_id)
         
-        if not item:
+        if not item or _is_tombstoned("employees", employee_id):
             return _json_response({"error": "Employee not found"}, 404)
 
+        # Roles are only granted (or admins edited) by admins
+        if not _caller_is_admin(req):
+            if _employee_role(item) == "admin" or "role" in payload or (
+                "position" in payload and _role_for_position(payload["position"]) == "admin"
+            ):
+                return _json_response({"error": "Only admins can change roles or edit admins"}, 403)
+        if "role" in payload and payload["role"] not in EMPLOYEE_ROLES:
+            return _json_response({"error": f"role must be one of {', '.join(EMPLOYEE_ROLES)}"}, 400)
+
+        if "email" in payload:
+            email = payload["email"]
+            if not isinstance(email, str) or not email.strip():
+                return _json_response({"error": "email must be a non-empty string"}, 400)
+            if not _claim_email(dict(item, email=email)):
+                return _json_response({"error": "An employee with this email already exists"}, 409)
+
+        # Pin the role of records created before roles were stored
+        updates = {"role": _employee_role(item)}
+
         # Update fields if provided
         if "name" in payload:
-            item["name"] = payload["name"]
+            updates["name"] = payload["name"]
         if "email" in payload:
-            item["email"] = payload["email"]
+            updates["email"] = payload["email"]
         if "position" in payload:
-            item["position"] = payload["position"]
+            updates["position"] = payload["position"]
         if "department" in payload:
-            item["department"] = payload["department"]
+            updates["department"] = payload["department"]
+        if "role" in payload:
+            updates["role"] = payload["role"]
 
-        item["updated_at"] = _utc_now_iso()
-        employees[idx] = item
-        _set_blob_json("employees/employees.json", employees)
+        updates["updated_at"] = _utc_now_iso()
+        item, previous = _update_record("employees/employees.json", employee_id, updates)
+        if not item:
+            return _json_response({"error": "Employee not found"}, 404)
+        previous_email = previous.get("email")
+        if previous_email and _email_index_path(previous_email) != _email_index_path(item["email"]):
+            _delete_email_index(previous_email, employee_id)
+        _set_email_index(item)
+        _record_change("employees", "upsert", item)
 
         return _json_response(item)
 
     except Exception as e:
         logging.exception("Error in update_employee")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
 
 
 @app.route(route="employees/{employee_id}", methods=["DELETE"])
 def delete_employee(req: func.HttpRequest) -> func.HttpResponse:
-    """DELETE /api/employees/{employee_id} - Delete an employee."""
+    """DELETE /api/employees/{employee_id} - Soft-delete an employee (tombstone)."""
     logging.info("DeleteEmployee called")
     try:
+        denied = _authorize(req, ("admin", "manager"))
+        if denied:
+            return denied
+
         employee_id = req.route_params.get("employee_id")
-        employees = _get_blob_json("employees/employees.json")
-        
-        item, idx = _find_by_id(employees, employee_id)
-        if not item:
-            return _json_response({"error": "Employee not found"}, 404)
 
-        deleted_item = employees.pop(idx)
-        _set_blob_json("employees/employees.json", employees)
+        # Tombstone only; purge_tombstones removes the record and its email
+        # index entry later (login already refuses tombstoned employees)
+        if not _record_exists("employees", employee_id) or not _write_tombstone("employees", employee_id):
+            return _json_response({"error": "Employee not found"}, 404)
+        _record_change("employees", "delete", {"id": employee_id})
 
-        return _json_response({"message": "Employee deleted", "item": deleted_item})
+        return _json_response({"message": "Employee deleted", "id": employee_id})
 
     except Exception as e:
         logging.exception("Error in delete_employee")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
 
 
 # ========== TASKS ==========
 
 @app.route(route="tasks", methods=["GET"])
 def get_tasks(req: func.HttpRequest) -> func.HttpResponse:
-    """GET /api/tasks - List all tasks."""
+    """
+    GET /api/tasks - List active tasks. Supports ?expand=employee.
+    ?include_archived=true also returns archived tasks.
+    """
     logging.info("GetTasks called")
     try:
-        tasks = _get_blob_json("tasks/tasks.json")
-        return _json_response(tasks)
+        expand, error = _parse_expand(req, {"employee"})
+        if error:
+            return _json_response({"error": error}, 400)
+
+        tasks = _without_tombstones("tasks", _get_blob_json("tasks/tasks.json"))
+        if _include_archived(req):
+            tasks += _get_archived("tasks")
+        return _json_response(_expand_items(tasks, expand))
     except Exception as e:
         logging.exception("Error in get_tasks")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
+
+
+@app.route(route="tasks/changes", methods=["GET"])
+def get_task_changes(req: func.HttpRequest) -> func.HttpResponse:
+    """GET /api/tasks/changes?since=<version> - Inserts, updates and deletes since a version."""
+    logging.info("GetTaskChanges called")
+    try:
+        return _changes_response(req, "tasks")
+    except Exception as e:
+        logging.exception("Error in get_task_changes")
+        return _error_response(e)
 
 
 @app.route(route="tasks/{task_id}", methods=["GET"])
 def get_task(req: func.HttpRequest) -> func.HttpResponse:
-    """GET /api/tasks/{task_id} - Get one task by id."""
+    """GET /api/tasks/{task_id} - Get one task by id (?include_archived=true to search archives)."""
     logging.info("GetTask called")
     try:
         task_id = req.route_params.get("task_id")
         tasks = _get_blob_json("tasks/tasks.json")
         
         item, _ = _find_by_id(tasks, task_id)
-        if not item:
+        if not item and _include_archived(req):
+            item, _ = _find_by_id(_get_archived("tasks"), task_id)
+        if not item or _is_tombstoned("tasks", task_id):
             return _json_response({"error": "Task not found"}, 404)
         
         return _json_response(item)
     except Exception as e:
         logging.exception("Error in get_task")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
 
 
 @app.route(route="tasks", methods=["POST"])
 def create_task(req: func.HttpRequest) -> func.HttpResponse:
-    """POST /api/tasks - Create a new task."""
+    """POST /api/tasks - Create a new task. Honours an Idempotency-Key header."""
     logging.info("CreateTask called")
     try:
+        replay = _idempotent_replay(req, "tasks")
+        if replay:
+            return replay
+
         try:
             payload = req.get_json()
         except ValueError:
@@ -256,10 +2029,6 @@ def create_task(req: func.HttpRequest) -> func.HttpResponse:
                 {"error": "title and employee_id are required"}, 400
             )
 
-        tasks = _get_blob_json("tasks/tasks.json")
-        if not isinstance(tasks, list):
-            tasks = []
-
         now = _utc_now_iso()
         new_task = {
             "id": str(uuid.uuid4()),
@@ -272,14 +2041,19 @@ def create_task(req: func.HttpRequest) -> func.HttpResponse:
             "updated_at": now
         }
 
-        tasks.append(new_task)
-        _set_blob_json("tasks/tasks.json", tasks)
-
+        _append_record("tasks/tasks.json", new_task)
+        _run_follow_ups(
+            "create_task",
+            lambda: _remember_idempotent(req, "tasks", new_task, 201),
+            lambda: _record_created("tasks", new_task),
+        )
         return _json_response(new_task, 201)
 
     except Exception as e:
         logging.exception("Error in create_task")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
+    finally:
+        _release_idempotency_key(req, "tasks")
 
 
 @app.route(route="tasks/{task_id}", methods=["PUT"])
@@ -294,93 +2068,123 @@ def update_task(req: func.HttpRequest) -> func.HttpResponse:
             return _json_response({"error": "Invalid JSON body"}, 400)
 
         tasks = _get_blob_json("tasks/tasks.json")
-        item, idx = _find_by_id(tasks, task_id)
+        item, _ = _find_by_id(tasks, task_id)
         
-        if not item:
+        if not item or _is_tombstoned("tasks", task_id):
             return _json_response({"error": "Task not found"}, 404)
 
         # Update fields if provided
+        updates = {}
         if "title" in payload:
-            item["title"] = payload["title"]
+            updates["title"] = payload["title"]
         if "description" in payload:
-            item["description"] = payload["description"]
+            updates["description"] = payload["description"]
         if "status" in payload:
-            item["status"] = payload["status"]
+            updates["status"] = payload["status"]
         if "due_date" in payload:
-            item["due_date"] = payload["due_date"]
+            updates["due_date"] = payload["due_date"]
         if "employee_id" in payload:
-            item["employee_id"] = payload["employee_id"]
+            updates["employee_id"] = payload["employee_id"]
 
-        item["updated_at"] = _utc_now_iso()
-        tasks[idx] = item
-        _set_blob_json("tasks/tasks.json", tasks)
+        updates["updated_at"] = _utc_now_iso()
+        item, previous = _update_record("tasks/tasks.json", task_id, updates)
+        if not item:
+            return _json_response({"error": "Task not found"}, 404)
+        _record_change("tasks", "upsert", item, previous.get("employee_id"))
 
         return _json_response(item)
 
     except Exception as e:
         logging.exception("Error in update_task")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
 
 
 @app.route(route="tasks/{task_id}", methods=["DELETE"])
 def delete_task(req: func.HttpRequest) -> func.HttpResponse:
-    """DELETE /api/tasks/{task_id} - Delete a task."""
+    """DELETE /api/tasks/{task_id} - Soft-delete a task (tombstone)."""
     logging.info("DeleteTask called")
     try:
+        denied = _authorize(req, ("admin",))
+        if denied:
+            return denied
+
         task_id = req.route_params.get("task_id")
-        tasks = _get_blob_json("tasks/tasks.json")
-        
-        item, idx = _find_by_id(tasks, task_id)
-        if not item:
-            return _json_response({"error": "Task not found"}, 404)
 
-        deleted_item = tasks.pop(idx)
-        _set_blob_json("tasks/tasks.json", tasks)
+        # Tombstone only; purge_tombstones removes the record later
+        if not _record_exists("tasks", task_id) or not _write_tombstone("tasks", task_id):
+            return _json_response({"error": "Task not found"}, 404)
+        _record_change("tasks", "delete", {"id": task_id})
 
-        return _json_response({"message": "Task deleted", "item": deleted_item})
+        return _json_response({"message": "Task deleted", "id": task_id})
 
     except Exception as e:
         logging.exception("Error in delete_task")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
 
 
 # ========== REMINDERS ==========
 
 @app.route(route="reminders", methods=["GET"])
 def get_reminders(req: func.HttpRequest) -> func.HttpResponse:
-    """GET /api/reminders - List all reminders."""
+    """
+    GET /api/reminders - List active reminders. Supports ?expand=employee.
+    ?include_archived=true also returns archived reminders.
+    """
     logging.info("GetReminders called")
     try:
-        reminders = _get_blob_json("reminders/reminders.json")
-        return _json_response(reminders)
+        expand, error = _parse_expand(req, {"employee"})
+        if error:
+            return _json_response({"error": error}, 400)
+
+        reminders = _without_tombstones("reminders", _get_blob_json("reminders/reminders.json"))
+        if _include_archived(req):
+            reminders += _get_archived("reminders")
+        return _json_response(_expand_items(reminders, expand))
     except Exception as e:
         logging.exception("Error in get_reminders")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
+
+
+@app.route(route="reminders/changes", methods=["GET"])
+def get_reminder_changes(req: func.HttpRequest) -> func.HttpResponse:
+    """GET /api/reminders/changes?since=<version> - Inserts, updates and deletes since a version."""
+    logging.info("GetReminderChanges called")
+    try:
+        return _changes_response(req, "reminders")
+    except Exception as e:
+        logging.exception("Error in get_reminder_changes")
+        return _error_response(e)
 
 
 @app.route(route="reminders/{reminder_id}", methods=["GET"])
 def get_reminder(req: func.HttpRequest) -> func.HttpResponse:
-    """GET /api/reminders/{reminder_id} - Get one reminder by id."""
+    """GET /api/reminders/{reminder_id} - Get one reminder by id (?include_archived=true to search archives)."""
     logging.info("GetReminder called")
     try:
         reminder_id = req.route_params.get("reminder_id")
         reminders = _get_blob_json("reminders/reminders.json")
         
         item, _ = _find_by_id(reminders, reminder_id)
-        if not item:
+        if not item and _include_archived(req):
+            item, _ = _find_by_id(_get_archived("reminders"), reminder_id)
+        if not item or _is_tombstoned("reminders", reminder_id):
             return _json_response({"error": "Reminder not found"}, 404)
         
         return _json_response(item)
     except Exception as e:
         logging.exception("Error in get_reminder")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
 
 
 @app.route(route="reminders", methods=["POST"])
 def create_reminder(req: func.HttpRequest) -> func.HttpResponse:
-    """POST /api/reminders - Create a new reminder."""
+    """POST /api/reminders - Create a new reminder. Honours an Idempotency-Key header."""
     logging.info("CreateReminder called")
     try:
+        replay = _idempotent_replay(req, "reminders")
+        if replay:
+            return replay
+
         try:
             payload = req.get_json()
         except ValueError:
@@ -396,10 +2200,6 @@ def create_reminder(req: func.HttpRequest) -> func.HttpResponse:
                 {"error": "title, employee_id, reminder_date are required"}, 400
             )
 
-        reminders = _get_blob_json("reminders/reminders.json")
-        if not isinstance(reminders, list):
-            reminders = []
-
         now = _utc_now_iso()
         new_reminder = {
             "id": str(uuid.uuid4()),
@@ -411,14 +2211,19 @@ def create_reminder(req: func.HttpRequest) -> func.HttpResponse:
             "updated_at": now
         }
 
-        reminders.append(new_reminder)
-        _set_blob_json("reminders/reminders.json", reminders)
-
+        _append_record("reminders/reminders.json", new_reminder)
+        _run_follow_ups(
+            "create_reminder",
+            lambda: _remember_idempotent(req, "reminders", new_reminder, 201),
+            lambda: _record_created("reminders", new_reminder),
+        )
         return _json_response(new_reminder, 201)
 
     except Exception as e:
         logging.exception("Error in create_reminder")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
+    finally:
+        _release_idempotency_key(req, "reminders")
 
 
 @app.route(route="reminders/{reminder_id}", methods=["PUT"])
@@ -433,66 +2238,145 @@ def update_reminder(req: func.HttpRequest) -> func.HttpResponse:
             return _json_response({"error": "Invalid JSON body"}, 400)
 
         reminders = _get_blob_json("reminders/reminders.json")
-        item, idx = _find_by_id(reminders, reminder_id)
+        item, _ = _find_by_id(reminders, reminder_id)
         
-        if not item:
+        if not item or _is_tombstoned("reminders", reminder_id):
             return _json_response({"error": "Reminder not found"}, 404)
 
         # Update fields if provided
+        updates = {}
         if "title" in payload:
-            item["title"] = payload["title"]
+            updates["title"] = payload["title"]
         if "description" in payload:
-            item["description"] = payload["description"]
+            updates["description"] = payload["description"]
         if "reminder_date" in payload:
-            item["reminder_date"] = payload["reminder_date"]
+            updates["reminder_date"] = payload["reminder_date"]
         if "employee_id" in payload:
-            item["employee_id"] = payload["employee_id"]
+            updates["employee_id"] = payload["employee_id"]
 
-        item["updated_at"] = _utc_now_iso()
-        reminders[idx] = item
-        _set_blob_json("reminders/reminders.json", reminders)
+        updates["updated_at"] = _utc_now_iso()
+        item, previous = _update_record("reminders/reminders.json", reminder_id, updates)
+        if not item:
+            return _json_response({"error": "Reminder not found"}, 404)
+        _record_change("reminders", "upsert", item, previous.get("employee_id"))
 
         return _json_response(item)
 
     except Exception as e:
         logging.exception("Error in update_reminder")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
 
 
 @app.route(route="reminders/{reminder_id}", methods=["DELETE"])
 def delete_reminder(req: func.HttpRequest) -> func.HttpResponse:
-    """DELETE /api/reminders/{reminder_id} - Delete a reminder."""
+    """DELETE /api/reminders/{reminder_id} - Soft-delete a reminder (tombstone)."""
     logging.info("DeleteReminder called")
     try:
+        denied = _authorize(req, ("admin",))
+        if denied:
+            return denied
+
         reminder_id = req.route_params.get("reminder_id")
-        reminders = _get_blob_json("reminders/reminders.json")
-        
-        item, idx = _find_by_id(reminders, reminder_id)
-        if not item:
-            return _json_response({"error": "Reminder not found"}, 404)
 
-        deleted_item = reminders.pop(idx)
-        _set_blob_json("reminders/reminders.json", reminders)
+        # Tombstone only; purge_tombstones removes the record later
+        if not _record_exists("reminders", reminder_id) or not _write_tombstone("reminders", reminder_id):
+            return _json_response({"error": "Reminder not found"}, 404)
+        _record_change("reminders", "delete", {"id": reminder_id})
 
-        return _json_response({"message": "Reminder deleted", "item": deleted_item})
+        return _json_response({"message": "Reminder deleted", "id": reminder_id})
 
     except Exception as e:
         logging.exception("Error in delete_reminder")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
 
 
 # ========== DOCUMENTS ==========
 
 @app.route(route="documents", methods=["GET"])
 def get_documents(req: func.HttpRequest) -> func.HttpResponse:
-    """GET /api/documents - List all documents."""
+    """GET /api/documents - List all documents. Supports ?expand=employee,task."""
     logging.info("GetDocuments called")
     try:
-        documents = _get_blob_json("documents/documents.json")
-        return _json_response(documents)
+        expand, error = _parse_expand(req, {"employee", "task"})
+        if error:
+            return _json_response({"error": error}, 400)
+
+        documents = _without_tombstones("documents", _get_blob_json("documents/documents.json"))
+        return _json_response(_expand_items(documents, expand))
     except Exception as e:
         logging.exception("Error in get_documents")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
+
+
+@app.route(route="documents/changes", methods=["GET"])
+def get_document_changes(req: func.HttpRequest) -> func.HttpResponse:
+    """GET /api/documents/changes?since=<version> - Inserts, updates and deletes since a version."""
+    logging.info("GetDocumentChanges called")
+    try:
+        return _changes_response(req, "documents")
+    except Exception as e:
+        logging.exception("Error in get_document_changes")
+        return _error_response(e)
+
+
+@app.route(route="documents/bundle", methods=["GET"])
+def get_document_bundle(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    GET /api/documents/bundle?employee_id=|task_id=
+    ZIP of every document of an employee and/or task. The archive is
+    written into bundles/<hash of the selection>.zip block by block (bounded
+    memory) and only then is the client redirected to a SAS URL; Storage
+    serves range requests, so interrupted downloads resume. The whole build
+    runs inside the request, so functionTimeout caps the bundle size. A
+    cached bundle is reused as long as the selection of documents is
+    unchanged.
+    Documents whose file has disappeared are left out and listed under
+    "skipped" (kept in the bundle's metadata for cached reuse).
+    """
+    logging.info("GetDocumentBundle called")
+    try:
+        employee_id = req.params.get("employee_id")
+        task_id = req.params.get("task_id")
+        if not employee_id and not task_id:
+            return _json_response({"error": "employee_id or task_id is required"}, 400)
+
+        documents = [
+            doc for doc in _without_tombstones("documents", _get_blob_json("documents/documents.json"))
+            if doc.get("blob_name")
+            and (not employee_id or doc.get("employee_id") == employee_id)
+            and (not task_id or doc.get("task_id") == task_id)
+        ]
+        if not documents:
+            return _json_response({"error": "No documents found"}, 404)
+
+        selection = sorted((doc["id"], doc["blob_name"], doc.get("file_name") or "") for doc in documents)
+        digest = hashlib.sha256(json.dumps(selection).encode("utf-8")).hexdigest()
+        bundle_name = f"bundles/{digest}.zip"
+
+        docs_container = blob_service_client.get_container_client(DOCUMENTS_CONTAINER)
+        bundle_client = docs_container.get_blob_client(bundle_name)
+        try:
+            with _storage_slot():
+                props = bundle_client.get_blob_properties()
+            cached = True
+            skipped = [doc_id for doc_id in (props.metadata.get("skipped") or "").split(",") if doc_id]
+        except ResourceNotFoundError:
+            cached = False
+            skipped = []
+            _upload_in_blocks(bundle_client, _iter_zip_chunks(documents, skipped), "application/zip")
+            if skipped:
+                with _storage_slot():
+                    bundle_client.set_blob_metadata({"skipped": ",".join(skipped)})
+
+        download_name = f"documents-{employee_id or task_id}.zip"
+        url = _blob_sas_url(DOCUMENTS_CONTAINER, bundle_name, download_name, EXPORT_LINK_MINUTES)
+        return _redirect_or_link(req, url, {"blob_name": bundle_name,
+                                            "documents": len(documents) - len(skipped),
+                                            "skipped": skipped, "cached": cached})
+
+    except Exception as e:
+        logging.exception("Error in get_document_bundle")
+        return _error_response(e)
 
 
 @app.route(route="documents/{document_id}", methods=["GET"])
@@ -504,23 +2388,33 @@ def get_document(req: func.HttpRequest) -> func.HttpResponse:
         documents = _get_blob_json("documents/documents.json")
         
         item, _ = _find_by_id(documents, document_id)
-        if not item:
+        if not item or _is_tombstoned("documents", document_id):
             return _json_response({"error": "Document not found"}, 404)
         
         return _json_response(item)
     except Exception as e:
         logging.exception("Error in get_document")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
 
 
 @app.route(route="documents", methods=["POST"])
-def create_document(req: func.HttpRequest) -> func.HttpResponse:
+@app.queue_output(arg_name="processing_queue", queue_name="document-processing",
+                  connection="BLOB_CONNECTION_STRING")
+def create_document(req: func.HttpRequest, processing_queue: func.Out[str]) -> func.HttpResponse:
     """
     POST /api/documents
     Accepts multipart/form-data with:
       - file: the uploaded file
       - title, description, employee_id
       - task_id, task_name, employee_name (NEW FIELDS)
+    employee_name / task_name are resolved from the lookup cache when the
+    ids are known; the form values are only used as a fallback.
+    Files are stored once under content/<sha256>; uploading bytes that are
+    already stored only adds a reference.
+    Text extraction and thumbnails happen later in process_document; until
+    then the record has processing_status "pending".
+    With an Idempotency-Key header a retried upload replays the stored
+    result instead of uploading the file again.
     """
     logging.info("CreateDocument (file + metadata) called")
     try:
@@ -548,29 +2442,40 @@ def create_document(req: func.HttpRequest) -> func.HttpResponse:
         original_name = file.filename or "upload"
         mime_type = file.mimetype or mimetypes.guess_type(original_name)[0] or "application/octet-stream"
         
-        file_bytes = file.stream.read()
-        file_size = len(file_bytes)
+        # 2) Hash while spooling; the hash is the blob name (content-addressed)
+        content_sha256, file_size, spool = _hash_upload(file.stream)
+
+        # A retried multipart body has a new boundary, so "the same request"
+        # is the same form fields and file bytes
+        fingerprint = hashlib.sha256(json.dumps({
+            "form": sorted(req.form.items()),
+            "file_name": original_name,
+            "content_sha256": content_sha256,
+        }).encode("utf-8")).hexdigest()
+        replay = _idempotent_replay(req, "documents", fingerprint)
+        if replay:
+            spool.close()
+            return replay
+
+        employee = _get_summaries("employees/employees.json").get(employee_id)
+        if employee:
+            employee_name = employee["name"]
+        if task_id:
+            task = _get_summaries("tasks/tasks.json").get(task_id)
+            if task:
+                task_name = task["title"]
 
-        # 2) Build blob name
-        _, ext = os.path.splitext(original_name)
         doc_id = str(uuid.uuid4())
-        blob_name = f"{employee_id}/{doc_id}{ext}"
+        blob_name = f"content/{content_sha256}"
 
-        # 3) Upload into documents-container
-        docs_container = blob_service_client.get_container_client(DOCUMENTS_CONTAINER)
-        blob_client = docs_container.get_blob_client(blob_name)
-        blob_client.upload_blob(file_bytes, overwrite=True)
+        # 3) Upload into documents-container, unless identical bytes are already stored
+        with spool:
+            uploaded, content_metadata = _add_content_reference(blob_name, spool, file_size, mime_type)
         
-        blob_url = blob_client.url
+        docs_container = blob_service_client.get_container_client(DOCUMENTS_CONTAINER)
+        blob_url = docs_container.get_blob_client(blob_name).url
 
         # 4) Append metadata
-        try:
-            documents = _get_blob_json("documents/documents.json")
-            if not isinstance(documents, list):
-                documents = []
-        except Exception:
-            documents = []
-
         now = _utc_now_iso()
         document_record = {
             "id": doc_id,
@@ -581,6 +2486,8 @@ def create_document(req: func.HttpRequest) -> func.HttpResponse:
             "mime_type": mime_type,
             "blob_name": blob_name,
             "blob_url": blob_url,
+            "content_sha256": content_sha256,
+            "deduplicated": not uploaded,
             "employee_id": str(employee_id),
             
             # --- SAVE NEW FIELDS ---
@@ -591,15 +2498,37 @@ def create_document(req: func.HttpRequest) -> func.HttpResponse:
             "created_at": now,
             "updated_at": now
         }
-
-        documents.append(document_record)
-        _set_blob_json("documents/documents.json", documents)
+        # Deduplicated content may already have been processed
+        document_record.update(_processing_fields(blob_name, content_metadata))
+
+        _append_record("documents/documents.json", document_record)
+        _run_follow_ups(
+            "create_document",
+            lambda: _remember_idempotent(req, "documents", document_record, 201, fingerprint),
+            lambda: _record_created("documents", document_record),
+        )
+
+        if uploaded:
+            # Sent once this function returns, i.e. after the record is saved.
+            # Only the upload that stored the content queues it; duplicates
+            # are covered by that message
+            processing_queue.set(json.dumps({
+                "blob_name": blob_name,
+                "content_sha256": content_sha256,
+                "mime_type": mime_type
+            }))
+        elif document_record["processing_status"] == "pending":
+            # The worker may have finished between our reference and the
+            # record write, in which case it did not see this record
+            _run_follow_ups("create_document", lambda: _catch_up_processing(blob_name))
 
         return _json_response(document_record, 201)
 
     except Exception as e:
         logging.exception("Error in create_document")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
+    finally:
+        _release_idempotency_key(req, "documents")
 
 
 @app.route(route="documents/{document_id}", methods=["PUT"])
@@ -614,60 +2543,953 @@ def update_document(req: func.HttpRequest) -> func.HttpResponse:
             return _json_response({"error": "Invalid JSON body"}, 400)
 
         documents = _get_blob_json("documents/documents.json")
-        item, idx = _find_by_id(documents, document_id)
+        item, _ = _find_by_id(documents, document_id)
         
-        if not item:
+        if not item or _is_tombstoned("documents", document_id):
             return _json_response({"error": "Document not found"}, 404)
 
         # Update standard fields
+        updates = {}
         if "title" in payload:
-            item["title"] = payload["title"]
+            updates["title"] = payload["title"]
         if "description" in payload:
-            item["description"] = payload["description"]
+            updates["description"] = payload["description"]
         if "employee_id" in payload:
-            item["employee_id"] = payload["employee_id"]
+            updates["employee_id"] = payload["employee_id"]
+            employee = _get_summaries("employees/employees.json").get(updates["employee_id"])
+            if employee:
+                updates["employee_name"] = employee["name"]
             
         # --- UPDATE NEW FIELDS IF PROVIDED ---
-        if "task_id" in payload:
-            item["task_id"] = payload["task_id"]
         if "task_name" in payload:
-            item["task_name"] = payload["task_name"]
-
-        item["updated_at"] = _utc_now_iso()
-        documents[idx] = item
-        _set_blob_json("documents/documents.json", documents)
+            updates["task_name"] = payload["task_name"]
+        if "task_id" in payload:
+            updates["task_id"] = payload["task_id"]
+            task = _get_summaries("tasks/tasks.json").get(updates["task_id"])
+            if task:
+                updates["task_name"] = task["title"]
+        updates["updated_at"] = _utc_now_iso()
+
+        # Conditional, so processing results recorded meanwhile are kept
+        item, _ = _update_record("documents/documents.json", document_id, updates)
+        if not item:
+            return _json_response({"error": "Document not found"}, 404)
+        _record_change("documents", "upsert", item)
 
         return _json_response(item)
 
     except Exception as e:
         logging.exception("Error in update_document")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
 
 
 @app.route(route="documents/{document_id}", methods=["DELETE"])
 def delete_document(req: func.HttpRequest) -> func.HttpResponse:
-    """DELETE /api/documents/{document_id} - Delete a document."""
+    """DELETE /api/documents/{document_id} - Soft-delete a document (tombstone)."""
     logging.info("DeleteDocument called")
     try:
+        denied = _authorize(req, ("admin",))
+        if denied:
+            return denied
+
         document_id = req.route_params.get("document_id")
-        documents = _get_blob_json("documents/documents.json")
-        
-        item, idx = _find_by_id(documents, document_id)
-        if not item:
-            return _json_response({"error": "Document not found"}, 404)
 
-        deleted_item = documents.pop(idx)
-        _set_blob_json("documents/documents.json", documents)
+        # Tombstone only; purge_tombstones removes the record later
+        if not _record_exists("documents", document_id) or not _write_tombstone("documents", document_id):
+            return _json_response({"error": "Document not found"}, 404)
+        _record_change("documents", "delete", {"id": document_id})
 
-        return _json_response({"message": "Document deleted", "item": deleted_item})
+        return _json_response({"message": "Document deleted", "id": document_id})
 
     except Exception as e:
         logging.exception("Error in delete_document")
-        return _json_response({"error": str(e)}, 500)
+        return _error_response(e)
+
+
+# ========== EXPORT / IMPORT ==========
+
+def _export_response(req: func.HttpRequest, entity: str):
+    """
+    Shared body of GET /api/{entity}/export?format=ndjson|csv.
+    Records are streamed from the collection blob into an export blob block
+    by block (constant memory); the client is then redirected to a
+    short-lived SAS URL so Storage streams the file to it.
+    Tasks and reminders: ?include_archived=true appends the archive
+    partitions after the hot records.
+    """
+    fmt = (req.params.get("format") or "ndjson").lower()
+    if fmt not in ("ndjson", "csv"):
+        return _json_response({"error": "format must be ndjson or csv"}, 400)
+    include_archived = entity in ("tasks", "reminders") and _include_archived(req)
+
+    deleted = _get_tombstoned_ids(entity)
+    fields = EXPORT_FIELDS[entity]
+
+    def lines():
+        if fmt == "csv":
+            out = io.StringIO()
+            writer = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            yield out.getvalue().encode("utf-8")
+        items = _iter_blob_records(f"{entity}/{entity}.json")
+        if include_archived:
+            items = itertools.chain(items, _iter_archived_records(entity))
+        for item in items:
+            if item.get("id") in deleted:
+                continue
+            if fmt == "ndjson":
+                yield (json.dumps(item) + "\n").encode("utf-8")
+            else:
+                out = io.StringIO()
+                csv.DictWriter(out, fieldnames=fields, extrasaction="ignore").writerow(item)
+                yield out.getvalue().encode("utf-8")
+
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    blob_name = f"exports/{entity}/{stamp}-{uuid.uuid4().hex[:8]}.{fmt}"
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    size = _upload_in_blocks(
+        container_client.get_blob_client(blob_name),
+        lines(),
+        "application/x-ndjson" if fmt == "ndjson" else "text/csv"
+    )
+
+    url = _blob_sas_url(DATA_CONTAINER, blob_name, f"{entity}-{stamp}.{fmt}", EXPORT_LINK_MINUTES)
+    return _redirect_or_link(req, url, {"blob_name": blob_name, "size": size})
+
+
+def _iter_import_records(body: bytes, fmt: str, entity: str):
+    """
+    Parse an NDJSON or CSV body line by line, yielding (line_number, record).
+    Either way only the EXPORT_FIELDS columns are kept.
+    """
+    stream = io.TextIOWrapper(io.BytesIO(body), encoding="utf-8", newline="")
+    fields = set(EXPORT_FIELDS[entity])
+    if fmt == "csv":
+        for line_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_number, {k: v for k, v in row.items() if k in fields and v != ""}
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if line.strip():
+                record = json.loads(line)
+                if isinstance(record, dict):
+                    record = {k: v for k, v in record.items() if k in fields}
+                yield line_number, record
+
+
+def _import_response(req: func.HttpRequest, entity: str):
+    """
+    Shared body of POST /api/{entity}/import?format=ndjson|csv.
+    Records are upserted by id (missing ids are generated). The body is
+    validated in a first pass; the second pass rewrites the collection as a
+    stream of blocks: existing records first, then the imported ones. The
+    commit is conditional on the ETag of the streamed read; if a request-path
+    write lands meanwhile, the second pass runs again from the new version.
+    """
+    fmt = (req.params.get("format") or "ndjson").lower()
+    if fmt not in ("ndjson", "csv"):
+        return _json_response({"error": "format must be ndjson or csv"}, 400)
+
+    body = req.get_body()
+    required = IMPORT_REQUIRED_FIELDS[entity]
+
+    # Employees: email -> id of the live records, to refuse duplicate emails
+    email_owners = {}
+    if entity == "employees":
+        deleted = _get_tombstoned_ids(entity)
+        for item in _iter_blob_records(f"{entity}/{entity}.json"):
+            if item.get("email") and item.get("id") not in deleted:
+                email_owners[item["email"].strip().lower()] = item.get("id")
+
+    # Pass 1: validate, collect the ids that will be replaced
+    imported_ids = set()
+    try:
+        for line_number, record in _iter_import_records(body, fmt, entity):
+            if not isinstance(record, dict) or not all(record.get(field) for field in required):
+                return _json_response(
+                    {"error": f"Line {line_number}: {', '.join(required)} are required"}, 400
+                )
+            if "id" in record and not isinstance(record["id"], str):
+                return _json_response({"error": f"Line {line_number}: id must be a string"}, 400)
+            if record.get("id") in imported_ids:
+                return _json_response({"error": f"Line {line_number}: duplicate id {record['id']}"}, 400)
+            if entity == "employees":
+                if not isinstance(record["email"], str):
+                    return _json_response({"error": f"Line {line_number}: email must be a string"}, 400)
+                if (record.get("role") or "employee") not in EMPLOYEE_ROLES:
+                    return _json_response(
+                        {"error": f"Line {line_number}: role must be one of {', '.join(EMPLOYEE_ROLES)}"}, 400
+                    )
+                email = record["email"].strip().lower()
+                owner = email_owners.get(email)
+                if owner is not None and owner != record.get("id"):
+                    return _json_response(
+                        {"error": f"Line {line_number}: an employee with email {record['email']} already exists"},
+                        409
+                    )
+                # Later lines see this one (a new record without id owns it as "")
+                email_owners[email] = record.get("id") or ""
+            if record.get("id"):
+                imported_ids.add(record["id"])
+    except (ValueError, csv.Error) as e:
+        return _json_response({"error": f"Invalid {fmt} body: {e}"}, 400)
+
+    blob_path = f"{entity}/{entity}.json"
+    now = _utc_now_iso()
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    for _ in range(CONDITIONAL_WRITE_RETRIES):
+        counts = {"created": 0, "updated": 0}
+        recent = []  # last CHANGE_LOG_LIMIT imported records, for the change feed
+        created_at = {}
+        replaced = {}  # id -> record being replaced (employees: for role / email index)
+        index_updates = []  # (previous email or None, record), applied once committed
+        properties = {}
+
+        def records():
+            for item in _iter_blob_records(blob_path, properties):
+                if item.get("id") in imported_ids:
+                    created_at[item["id"]] = item.get("created_at")
+                    if entity == "employees":
+                        replaced[item["id"]] = item
+                    counts["updated"] += 1
+                else:
+                    yield item  # tombstoned ones too, the purger still needs them
+            for _, record in _iter_import_records(body, fmt, entity):
+                record = dict(record)
+                record.setdefault("id", str(uuid.uuid4()))
+                if record["id"] not in created_at:
+                    counts["created"] += 1
+                record["created_at"] = created_at.get(record["id"]) or record.get("created_at") or now
+                record["updated_at"] = now
+                if entity == "employees":
+                    previous = replaced.get(record["id"]) or {}
+                    record["role"] = record.get("role") or (
+                        _employee_role(previous) if previous else _role_for_position(record.get("position"))
+                    )
+                    index_updates.append((previous.get("email"), record))
+                recent.append(record)
+                del recent[:-CHANGE_LOG_LIMIT]
+                yield record
+
+        stream = records()
+        first = next(stream, None)  # opens the download, so properties["etag"] is set
+
+        def chunks():
+            if first is None:
+                yield b"[]"
+                return
+            yield b"[\n" + json.dumps(first, indent=2).encode("utf-8")
+            for item in stream:
+                yield b",\n" + json.dumps(item, indent=2).encode("utf-8")
+            yield b"\n]"
+
+        try:
+            _upload_in_blocks(
+                container_client.get_blob_client(blob_path), chunks(), "application/json",
+                etag=properties["etag"]
+            )
+            break
+        except ResourceModifiedError:
+            continue
+    else:
+        return _json_response(
+            {"error": f"{entity} kept changing during the import, please retry"}, 409
+        )
+    _invalidate_blob_json(blob_path)
+
+    for previous_email, record in index_updates:
+        if previous_email and _email_index_path(previous_email) != _email_index_path(record["email"]):
+            _delete_email_index(previous_email, record["id"])
+        _set_email_index(record)
+
+    total = counts["created"] + counts["updated"]
+    _record_changes(entity, "upsert", recent, skipped=total - len(recent))
+    return _json_response(dict(counts, imported=total))
+
+
+@app.route(route="employees/export", methods=["GET"])
+def export_employees(req: func.HttpRequest) -> func.HttpResponse:
+    """GET /api/employees/export?format=ndjson|csv - Stream all employees to a downloadable file."""
+    logging.info("ExportEmployees called")
+    try:
+        return _export_response(req, "employees")
+    except Exception as e:
+        logging.exception("Error in export_employees")
+        return _error_response(e)
+
+
+@app.route(route="employees/import", methods=["POST"])
+def import_employees(req: func.HttpRequest) -> func.HttpResponse:
+    """POST /api/employees/import?format=ndjson|csv - Bulk upsert employees."""
+    logging.info("ImportEmployees called")
+    try:
+        denied = _authorize(req, ("admin",))
+        if denied:
+            return denied
+        return _import_response(req, "employees")
+    except Exception as e:
+        logging.exception("Error in import_employees")
+        return _error_response(e)
+
+
+@app.route(route="tasks/export", methods=["GET"])
+def export_tasks(req: func.HttpRequest) -> func.HttpResponse:
+    """GET /api/tasks/export?format=ndjson|csv[&include_archived=true] - Stream all tasks to a downloadable file."""
+    logging.info("ExportTasks called")
+    try:
+        return _export_response(req, "tasks")
+    except Exception as e:
+        logging.exception("Error in export_tasks")
+        return _error_response(e)
+
+
+@app.route(route="tasks/import", methods=["POST"])
+def import_tasks(req: func.HttpRequest) -> func.HttpResponse:
+    """POST /api/tasks/import?format=ndjson|csv - Bulk upsert tasks."""
+    logging.info("ImportTasks called")
+    try:
+        denied = _authorize(req, ("admin",))
+        if denied:
+            return denied
+        return _import_response(req, "tasks")
+    except Exception as e:
+        logging.exception("Error in import_tasks")
+        return _error_response(e)
+
+
+@app.route(route="reminders/export", methods=["GET"])
+def export_reminders(req: func.HttpRequest) -> func.HttpResponse:
+    """GET /api/reminders/export?format=ndjson|csv[&include_archived=true] - Stream all reminders to a downloadable file."""
+    logging.info("ExportReminders called")
+    try:
+        return _export_response(req, "reminders")
+    except Exception as e:
+        logging.exception("Error in export_reminders")
+        return _error_response(e)
+
+
+@app.route(route="reminders/import", methods=["POST"])
+def import_reminders(req: func.HttpRequest) -> func.HttpResponse:
+    """POST /api/reminders/import?format=ndjson|csv - Bulk upsert reminders."""
+    logging.info("ImportReminders called")
+    try:
+        denied = _authorize(req, ("admin",))
+        if denied:
+            return denied
+        return _import_response(req, "reminders")
+    except Exception as e:
+        logging.exception("Error in import_reminders")
+        return _error_response(e)
+
+
+@app.route(route="documents/export", methods=["GET"])
+def export_documents(req: func.HttpRequest) -> func.HttpResponse:
+    """GET /api/documents/export?format=ndjson|csv - Stream all documents to a downloadable file."""
+    logging.info("ExportDocuments called")
+    try:
+        return _export_response(req, "documents")
+    except Exception as e:
+        logging.exception("Error in export_documents")
+        return _error_response(e)
+
+
+# ========== SUBSCRIPTIONS ==========
+
+@app.route(route="subscribe", methods=["GET"])
+async def subscribe(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    GET /api/subscribe?employee_id=&timeout=
+    Long-poll for task and reminder changes. Holds the request open until a
+    relevant change arrives or `timeout` seconds pass (max SUBSCRIBE_MAX_WAIT_SECONDS).
+    Resume from the `cursor` query param or the Last-Event-ID header.
+    With Accept: text/event-stream the events are sent as SSE, so an
+    EventSource simply reconnects after each batch.
+    The handler is async: a waiting subscriber parks on the event loop
+    instead of occupying one of the worker's sync handler threads, and the
+    (blocking) change-log reads run in a helper thread.
+    """
+    logging.info("Subscribe called")
+    try:
+        employee_id = req.params.get("employee_id")
+        try:
+            timeout = min(float(req.params.get("timeout", SUBSCRIBE_MAX_WAIT_SECONDS)),
+                          SUBSCRIBE_MAX_WAIT_SECONDS)
+        except ValueError:
+            return _json_response({"error": "timeout must be a number"}, 400)
+
+        raw_cursor = req.params.get("cursor") or req.headers.get("Last-Event-ID")
+        cursor = _parse_cursor(raw_cursor)
+        deadline = time.monotonic() + timeout
+        seen_seq = _publish_seq
+
+        events, cursor = await asyncio.to_thread(_collect_events, cursor, employee_id)
+        while not events:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            seq = await _wait_for_local_change(seen_seq, employee_id,
+                                               min(remaining, SUBSCRIBE_RECHECK_SECONDS))
+            seen_seq = seq
+            events, cursor = await asyncio.to_thread(_collect_events, cursor, employee_id)
+
+        cursor_text = _format_cursor(cursor)
+        if "text/event-stream" not in (req.headers.get("Accept") or ""):
+            return _json_response({"cursor": cursor_text, "events": events})
+
+        lines = ["retry: 1000", ""]
+        for event in events:
+            lines += [f"id: {event['cursor']}", f"event: {event['entity']}",
+                      f"data: {json.dumps(event)}", ""]
+        lines += [f"id: {cursor_text}", ""]
+        return func.HttpResponse(
+            body="\n".join(lines) + "\n",
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+            status_code=200
+        )
+
+    except Exception as e:
+        logging.exception("Error in subscribe")
+        return _error_response(e)
+
+
+# ========== BACKGROUND JOBS ==========
+
+@app.timer_trigger(schedule="0 */15 * * * *", arg_name="timer", run_on_startup=False)
+def refresh_document_names(timer: func.TimerRequest) -> None:
+    """
+    Every 15 minutes: rewrite stale employee_name / task_name values in
+    documents.json after employees or tasks were renamed.
+    """
+    logging.info("RefreshDocumentNames called")
+    try:
+        # Always start from storage, not from another request's cache
+        _summary_cache.clear()
+        employees = _get_summaries("employees/employees.json")
+        tasks = _get_summaries("tasks/tasks.json")
+
+        # Conditional, so uploads and edits that land meanwhile are re-read, not lost
+        def refresh(documents):
+            changed = []
+            for doc in documents or []:
+                stale = False
+                employee = employees.get(doc.get("employee_id"))
+                if employee and doc.get("employee_name") != employee["name"]:
+                    doc["employee_name"] = employee["name"]
+                    stale = True
+                task = tasks.get(doc.get("task_id"))
+                if task and doc.get("task_name") != task["title"]:
+                    doc["task_name"] = task["title"]
+                    stale = True
+                if stale:
+                    doc["updated_at"] = _utc_now_iso()
+                    changed.append(doc)
+            return (documents if changed else None), changed
+
+        changed = _update_blob_json("documents/documents.json", refresh)
+        if changed:
+            _record_changes("documents", "upsert", changed)
+        logging.info("RefreshDocumentNames updated %d document(s)", len(changed))
+
+    except Exception:
+        logging.exception("Error in refresh_document_names")
+
+
+@app.queue_trigger(arg_name="msg", queue_name="document-processing",
+                   connection="BLOB_CONNECTION_STRING")
+def process_document(msg: func.QueueMessage) -> None:
+    """
+    Queued by create_document: extract text, page count and a thumbnail for
+    newly stored content, write them under derived/<sha256>/ and record the
+    results on every document that references the content.
+    Content that was already processed (a duplicate upload raced the first
+    one) only has its results copied onto the records.
+    """
+    logging.info("ProcessDocument called")
+    payload = msg.get_json()
+    blob_name = payload["blob_name"]
+
+    docs_container = blob_service_client.get_container_client(DOCUMENTS_CONTAINER)
+    try:
+        with _storage_slot():
+            props = docs_container.get_blob_client(blob_name).get_blob_properties()
+    except ResourceNotFoundError:
+        logging.info("ProcessDocument: %s was deleted before processing", blob_name)
+        return
+
+    metadata = dict(props.metadata)
+    if metadata.get("processed") not in ("true", "failed"):
+        try:
+            updates = _derive_content(blob_name, payload.get("mime_type"))
+        except Exception:
+            if msg.dequeue_count < DOCUMENT_PROCESSING_MAX_ATTEMPTS:
+                raise  # the queue redelivers the message
+            logging.exception("ProcessDocument giving up on %s", blob_name)
+            updates = {"processed": "failed"}
+
+        if not _update_content_metadata(blob_name, updates):
+            logging.info("ProcessDocument: %s was deleted during processing", blob_name)
+            return
+        metadata.update(updates)
+
+    count = _apply_processing_fields(blob_name, _processing_fields(blob_name, metadata))
+    logging.info("ProcessDocument updated %d document(s) for %s", count, blob_name)
+
+
+@app.timer_trigger(schedule="0 */30 * * * *", arg_name="timer", run_on_startup=False)
+def purge_tombstones(timer: func.TimerRequest) -> None:
+    """
+    Every 30 minutes: physically remove soft-deleted records in one rewrite
+    per collection, then delete their tombstones and document blobs in batches.
+    Also sweeps document blobs that no record references any more,
+    expired Idempotency-Key records, old export files and cached bundles.
+    """
+    logging.info("PurgeTombstones called")
+    data_container = blob_service_client.get_container_client(DATA_CONTAINER)
+    docs_container = blob_service_client.get_container_client(DOCUMENTS_CONTAINER)
+
+    for entity in ("employees", "tasks", "reminders", "documents"):
+        try:
+            deleted = _get_tombstoned_ids(entity)
+            if not deleted:
+                continue
+
+            # Conditional rewrites: writes that land while the purge runs
+            # make it re-read instead of being overwritten
+            def purge(items):
+                items = items or []
+                removed = [item for item in items if item.get("id") in deleted]
+                if not removed:
+                    return None, removed
+                return [item for item in items if item.get("id") not in deleted], removed
+
+            removed = _update_blob_json(f"{entity}/{entity}.json", purge)
+
+            # Deleted items that were already archived live in the partitions
+            if entity in ("tasks", "reminders") and len(removed) < len(deleted):
+                for partition_path, archived in _get_archive_partitions(entity).items():
+                    if not any(item.get("id") in deleted for item in archived):
+                        continue
+
+                    partition_removed = []
+
+                    def purge_partition(items):
+                        partition_removed[:] = [item for item in items if item.get("id") in deleted]
+                        if not partition_removed:
+                            return None
+                        return [item for item in items if item.get("id") not in deleted]
+
+                    _update_archive_partition(partition_path, purge_partition)
+                    removed += partition_removed
+
+            if entity == "employees":
+                for employee in removed:
+                    if employee.get("email"):
+                        _delete_email_index(employee["email"], employee["id"])
+
+            if entity == "documents":
+                # Content-addressed blobs are shared: drop references, the
+                # last one deletes the blob. Legacy per-document blobs go directly.
+                released = {}
+                legacy = []
+                for doc in removed:
+                    blob_name = doc.get("blob_name")
+                    if not blob_name:
+                        continue
+                    if blob_name.startswith("content/"):
+                        released[blob_name] = released.get(blob_name, 0) + 1
+                    else:
+                        legacy.append(blob_name)
+                for blob_name, count in released.items():
+                    _release_content_reference(blob_name, count)
+                _delete_blobs_in_batches(docs_container, legacy)
+
+            _delete_blobs_in_batches(data_container, [f"tombstones/{entity}/{item_id}" for item_id in deleted])
+            logging.info("PurgeTombstones removed %d %s", len(removed), entity)
+
+        except Exception:
+            logging.exception("Error purging %s", entity)
+
+    try:
+        # Stored Idempotency-Key responses past their TTL
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+        expired = [
+            blob.name for blob in _list_blobs(data_container, "idempotency/")
+            if blob.last_modified < cutoff
+        ]
+        _delete_blobs_in_batches(data_container, expired)
+        logging.info("PurgeTombstones removed %d expired idempotency record(s)", len(expired))
+
+    except Exception:
+        logging.exception("Error purging idempotency records")
+
+    try:
+        # Export files past EXPORT_TTL_HOURS (their SAS links expired long before)
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=EXPORT_TTL_HOURS)
+        expired = [
+            blob.name for blob in _list_blobs(data_container, "exports/")
+            if blob.last_modified < cutoff
+        ]
+        _delete_blobs_in_batches(data_container, expired)
+        logging.info("PurgeTombstones removed %d expired export(s)", len(expired))
+
+    except Exception:
+        logging.exception("Error purging exports")
+
+    try:
+        # Cached document bundles past BUNDLE_CACHE_HOURS
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=BUNDLE_CACHE_HOURS)
+        expired = [
+            blob.name for blob in _list_blobs(docs_container, "bundles/")
+            if blob.last_modified < cutoff
+        ]
+        _delete_blobs_in_batches(docs_container, expired)
+        logging.info("PurgeTombstones removed %d cached bundle(s)", len(expired))
+
+    except Exception:
+        logging.exception("Error purging bundles")
+
+    try:
+        # Orphans: blobs older than the grace period with no metadata record
+        # (uploads whose metadata write failed, or deletes from before tombstones)
+        documents = _without_tombstones("documents", _get_blob_json("documents/documents.json"))
+        referenced = {doc.get("blob_name") for doc in documents}
+        referenced_derived = {_derived_prefix(name) for name in referenced if name}
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=ORPHAN_BLOB_GRACE_HOURS)
+
+        def is_referenced(name):
+            if name.startswith("derived/"):
+                return name.rsplit("/", 1)[0] + "/" in referenced_derived
+            return name in referenced
+
+        # Deletes are conditional on the ETag seen here: a duplicate upload
+        # that bumps the refcount of an old blob before its record is written
+        # changes the ETag (or, earlier, Last-Modified), so that blob survives
+        orphans = [
+            {"name": blob.name, "etag": blob.etag, "match_condition": MatchConditions.IfNotModified}
+            for blob in _list_blobs(docs_container)
+            if not is_referenced(blob.name) and blob.last_modified < cutoff
+            and not blob.name.startswith("bundles/")
+        ]
+        _delete_blobs_in_batches(docs_container, orphans)
+        logging.info("PurgeTombstones removed %d orphaned document blob(s)", len(orphans))
+
+    except Exception:
+        logging.exception("Error sweeping orphaned document blobs")
+
+
+@app.timer_trigger(schedule="0 0 2 * * *", arg_name="timer", run_on_startup=False)
+def archive_history(timer: func.TimerRequest) -> None:
+    """
+    Daily: move completed tasks (untouched for ARCHIVE_COMPLETED_AFTER_DAYS)
+    and past reminders (older than ARCHIVE_REMINDERS_AFTER_DAYS) into
+    monthly archive partitions, so the hot collections only hold active work.
+    Partitions move to ARCHIVE_BLOB_TIER once their month is closed.
+    """
+    logging.info("ArchiveHistory called")
+    month = re.compile(r"^\d{4}-\d{2}")
+
+    def month_of(value):
+        match = month.match(value or "")
+        return match.group(0) if match else None
+
+    now = datetime.utcnow()
+    task_cutoff = (now - timedelta(days=ARCHIVE_COMPLETED_AFTER_DAYS)).isoformat()
+    reminder_cutoff = (now - timedelta(days=ARCHIVE_REMINDERS_AFTER_DAYS)).isoformat()
+
+    try:
+        count = _archive_items(
+            "tasks",
+            lambda task: month_of(task.get("updated_at")),
+            lambda task: task.get("status") == "completed" and (task.get("updated_at") or "") < task_cutoff
+        )
+        logging.info("ArchiveHistory archived %d task(s), tiered %d partition(s)",
+                     count, _tier_closed_partitions("tasks"))
+    except Exception:
+        logging.exception("Error archiving tasks")
+
+    try:
+        count = _archive_items(
+            "reminders",
+            lambda reminder: month_of(reminder.get("reminder_date")),
+            lambda reminder: (reminder.get("reminder_date") or "9999") < reminder_cutoff
+        )
+        logging.info("ArchiveHistory archived %d reminder(s), tiered %d partition(s)",
+                     count, _tier_closed_partitions("reminders"))
+    except Exception:
+        logging.exception("Error archiving reminders")
 
 
 # ========== SETUP DATA ==========
 
+# Vocabulary for synthetic records (setup-data?seed=)
+_SEED_FIRST_NAMES = (
+    "Ana", "Ben", "Chloe", "David", "Elena", "Farid", "Grace", "Hugo", "Ines", "Jonas",
+    "Kira", "Liam", "Maya", "Noah", "Olga", "Pablo", "Quinn", "Rosa", "Sami", "Tara",
+)
+_SEED_LAST_NAMES = (
+    "Almeida", "Becker", "Costa", "Dubois", "Evans", "Fischer", "Garcia", "Hansen",
+    "Ivanova", "Jensen", "Kowalski", "Lopez", "Moreau", "Nakamura", "Olsen", "Petrov",
+)
+# (position, department, weight); roles follow _role_for_position
+_SEED_POSITIONS = (
+    ("Software Engineer", "Engineering", 30),
+    ("QA Engineer", "Engineering", 8),
+    ("Engineering Manager", "Engineering", 4),
+    ("Product Designer", "Product", 6),
+    ("Product Manager", "Product", 4),
+    ("Sales Representative", "Sales", 14),
+    ("Sales Manager", "Sales", 2),
+    ("HR Specialist", "People", 5),
+    ("Accountant", "Finance", 6),
+    ("Support Agent", "Support", 20),
+    ("System Administrator", "IT", 1),
+)
+_SEED_TASK_VERBS = ("Review", "Update", "Prepare", "Draft", "Audit", "Migrate", "Plan", "Fix")
+_SEED_TASK_OBJECTS = (
+    "quarterly report", "onboarding checklist", "customer contract", "release notes",
+    "budget forecast", "security review", "sprint backlog", "training material",
+    "vendor invoice", "support playbook",
+)
+_SEED_TASK_STATUSES = (("pending", 40), ("in-progress", 30), ("completed", 30))
+_SEED_REMINDER_TITLES = (
+    "Team sync", "Submit timesheet", "1:1 meeting", "Renew certificate",
+    "Follow up with client", "Expense report due", "Performance review",
+)
+_SEED_FILE_TYPES = (
+    ("pdf", "application/pdf", 50),
+    ("docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", 20),
+    ("png", "image/png", 15),
+    ("txt", "text/plain", 15),
+)
+
+
+def _parse_seed_spec(spec: str):
+    """
+    Parse "employees:10000,tasks:200000" into {"employees": 10000, "tasks": 200000}.
+    Raises ValueError with a message suitable for a 400 response.
+    """
+    counts = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        entity, _, count = part.partition(":")
+        entity = entity.strip().lower()
+        if entity not in SEED_ENTITIES:
+            raise ValueError(f"Unknown seed entity '{entity}' (use {', '.join(SEED_ENTITIES)})")
+        try:
+            count = int(count)
+        except ValueError:
+            raise ValueError(f"Invalid count for {entity}: '{count}'")
+        if not 0 <= count <= SEED_MAX_RECORDS:
+            raise ValueError(f"{entity} count must be between 0 and {SEED_MAX_RECORDS}")
+        counts[entity] = count
+
+    if not counts:
+        raise ValueError("seed must list at least one entity, e.g. employees:100")
+    if not counts.get("employees") and any(counts.get(entity) for entity in SEED_ENTITIES[1:]):
+        raise ValueError("tasks, reminders and documents need employees in the same seed")
+    return counts
+
+
+def _seed_rng(rng_seed: int, entity: str, index: int):
+    """One RNG per record, so any record can be rebuilt from its index alone."""
+    return random.Random(f"{rng_seed}:{entity}:{index}")
+
+
+def _seed_owner(rng_seed: int, entity: str, index: int, counts: dict):
+    """Index of the employee that owns record `index` (own stream, so documents can look it up)."""
+    return _seed_rng(rng_seed, f"{entity}-owner", index).randrange(counts["employees"])
+
+
+def _seed_id(rng: random.Random):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _seed_pick(rng: random.Random, weighted: tuple):
+    """Pick from (..., weight) tuples."""
+    return rng.choices(weighted, weights=[option[-1] for option in weighted])[0]
+
+
+def _seed_timestamp(anchor: datetime, rng: random.Random, max_days_ago: int):
+    moment = anchor - timedelta(seconds=rng.randrange(max_days_ago * 86400))
+    return moment, moment.isoformat() + "Z"
+
+
+def _seed_record(entity: str, index: int, counts: dict, rng_seed: int, anchor: datetime):
+    """
+    Build synthetic record `index` of `entity`. References are drawn by index
+    and resolved by rebuilding the referenced record, so tasks, reminders and
+    documents always point at employees / tasks of the same seed.
+    """
+    rng = _seed_rng(rng_seed, entity, index)
+    record_id = _seed_id(rng)
+    created, created_at = _seed_timestamp(anchor, rng, 365)
+
+    if entity == "employees":
+        first, last = rng.choice(_SEED_FIRST_NAMES), rng.choice(_SEED_LAST_NAMES)
+        position, department, _ = _seed_pick(rng, _SEED_POSITIONS)
+        if index == 0:
+            position, department = "System Administrator", "IT"  # always one admin to log in as
+        return {
+            "id": record_id,
+            "name": f"{first} {last}",
+            "email": f"{first}.{last}.{index}@example.com".lower(),
+            "position": position,
+            "department": department,
+            "role": _role_for_position(position),
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+    if entity == "tasks":
+        employee = _seed_record("employees", _seed_owner(rng_seed, entity, index, counts),
+                                counts, rng_seed, anchor)
+        status, _ = _seed_pick(rng, _SEED_TASK_STATUSES)
+        updated = min(anchor, created + timedelta(seconds=rng.randrange(30 * 86400)))
+        return {
+            "id": record_id,
+            "title": f"{rng.choice(_SEED_TASK_VERBS)} {rng.choice(_SEED_TASK_OBJECTS)}",
+            "description": f"Synthetic task #{index}",
+            "employee_id": employee["id"],
+            "status": status,
+            "due_date": (created + timedelta(days=rng.randint(1, 60))).date().isoformat(),
+            "created_at": created_at,
+            "updated_at": updated.isoformat() + "Z",
+        }
+
+    if entity == "reminders":
+        employee = _seed_record("employees", _seed_owner(rng_seed, entity, index, counts),
+                                counts, rng_seed, anchor)
+        reminder_date = anchor + timedelta(minutes=rng.randint(-30 * 1440, 30 * 1440))
+        return {
+            "id": record_id,
+            "title": rng.choice(_SEED_REMINDER_TITLES),
+            "description": f"Synthetic reminder #{index}",
+            "reminder_date": reminder_date.isoformat() + "Z",
+            "employee_id": employee["id"],
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+    # documents: attached to a task (and its assignee) when tasks are seeded
+    task = None
+    if counts.get("tasks"):
+        task_index = rng.randrange(counts["tasks"])
+        task = _seed_record("tasks", task_index, counts, rng_seed, anchor)
+        employee_index = _seed_owner(rng_seed, "tasks", task_index, counts)
+    else:
+        employee_index = _seed_owner(rng_seed, entity, index, counts)
+    employee = _seed_record("employees", employee_index, counts, rng_seed, anchor)
+    extension, mime_type, _ = _seed_pick(rng, _SEED_FILE_TYPES)
+    content_sha256 = hashlib.sha256(f"{rng_seed}:documents:{index}".encode("utf-8")).hexdigest()
+    blob_name = f"content/{content_sha256}"
+    title = f"{rng.choice(_SEED_TASK_OBJECTS).capitalize()} {index}"
+    return {
+        "id": record_id,
+        "title": title,
+        "description": f"Synthetic document #{index}",
+        "file_name": f"{title.lower().replace(' ', '-')}.{extension}",
+        "file_size": int(1024 * 2 ** rng.uniform(0, 14)),  # 1 KB .. 16 MB, log-uniform
+        "mime_type": mime_type,
+        "blob_name": blob_name,
+        "blob_url": blob_service_client.get_container_client(DOCUMENTS_CONTAINER).get_blob_client(blob_name).url,
+        "content_sha256": content_sha256,
+        "deduplicated": False,
+        "employee_id": employee["id"],
+        "employee_name": employee["name"],
+        "task_id": task["id"] if task else None,
+        "task_name": task["title"] if task else None,
+        "processing_status": "processed",
+        "page_count": rng.randint(1, 40) if mime_type == "application/pdf" else None,
+        "text_blob": None,
+        "thumbnail_blob": None,
+        "created_at": created_at,
+        "updated_at": created_at,
+    }
+
+
+def _seed_collection(entity: str, counts: dict, rng_seed: int, anchor: datetime):
+    """
+    Replace {entity}/{entity}.json with counts[entity] synthetic records,
+    streamed as staged blocks like an import. Old tombstones and archive
+    partitions of the collection go too, and the change log moves past
+    every old version so replicas reload. Returns the employees written
+    (for the email index), otherwise an empty list.
+    """
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    stale = _list_blob_names(container_client, f"tombstones/{entity}/")
+    stale += _list_blob_names(container_client, f"{entity}/archive/")
+    _delete_blobs_in_batches(container_client, stale)
+
+    blob_path = f"{entity}/{entity}.json"
+    count = counts[entity]
+    employees = []
+    recent = []  # last CHANGE_LOG_LIMIT records, for the change feed
+
+    def chunks():
+        yield b"["
+        for index in range(count):
+            record = _seed_record(entity, index, counts, rng_seed, anchor)
+            if entity == "employees":
+                employees.append(record)
+            recent.append(record)
+            del recent[:-CHANGE_LOG_LIMIT]
+            yield (",\n" if index else "\n").encode("utf-8") + json.dumps(record, indent=2).encode("utf-8")
+        yield b"\n]"
+
+    _upload_in_blocks(container_client.get_blob_client(blob_path), chunks(), "application/json")
+    _invalidate_blob_json(blob_path)
+
+    # +1: the replaced contents count as a change no replica has seen
+    _record_changes(entity, "upsert", recent, skipped=count - len(recent) + 1)
+    return employees
+
+
+def _seed_conflicts(counts: dict):
+    """
+    Collections left out of an employees seed that still hold records
+    (live or archived). Their employee_ids point at employees the seed
+    replaces, so seeding would orphan them.
+    """
+    if "employees" not in counts:
+        return []
+    container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+    conflicts = []
+    for entity in SEED_ENTITIES[1:]:
+        if entity in counts:
+            continue
+        deleted = _get_tombstoned_ids(entity)
+        if any(item.get("id") not in deleted for item in _iter_blob_records(f"{entity}/{entity}.json")):
+            conflicts.append(entity)
+        elif entity in ("tasks", "reminders") and _list_blob_names(container_client, f"{entity}/archive/"):
+            conflicts.append(entity)
+    return conflicts
+
+
+def _seed_data(counts: dict, rng_seed: int):
+    """
+    Write the seeded collections concurrently, then rebuild the login email
+    index for the seeded employees with SEED_UPLOAD_CONCURRENCY parallel uploads.
+    """
+    anchor = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    with ThreadPoolExecutor(max_workers=len(counts)) as pool:
+        futures = {
+            entity: pool.submit(_seed_collection, entity, counts, rng_seed, anchor)
+            for entity in counts
+        }
+        employees = [employee for future in futures.values() for employee in future.result()]
+
+    indexed = 0
+    if "employees" in counts:
+        container_client = blob_service_client.get_container_client(DATA_CONTAINER)
+        _delete_blobs_in_batches(container_client, _list_blob_names(container_client, "employees/email-index/"))
+        with ThreadPoolExecutor(max_workers=SEED_UPLOAD_CONCURRENCY) as pool:
+            indexed = sum(1 for _ in pool.map(_set_email_index, employees))
+
+    return {"seeded": counts, "random_seed": rng_seed, "email_index_entries": indexed}
+
+
 @app.route(route="setup-data", methods=["POST", "GET"])
 def setup_data(req: func.HttpRequest) -> func.HttpResponse:
     """
@@ -678,6 +3500,15 @@ def setup_data(req: func.HttpRequest) -> func.HttpResponse:
       data-container/reminders/reminders.json
       data-container/documents/documents.json
     Each file starts as an empty JSON array [].
+
+    POST ?seed=employees:10000,tasks:200000,reminders:50000,documents:20000
+    replaces the listed collections with synthetic, referentially consistent
+    records. Only when SEED_ENABLED=true, admin only when AUTH_REQUIRED.
+    Seeding employees without tasks / reminders / documents that still have
+    records is refused (409); list them with a count of 0 to clear them.
+    ?random_seed=<int> (default 1) makes the data reproducible; dates are
+    relative to today. Seeded documents are metadata only, no file content
+    is uploaded.
     """
     logging.info("SetupData called")
 
@@ -690,14 +3521,36 @@ def setup_data(req: func.HttpRequest) -> func.HttpResponse:
                 {"error": "BLOB_CONNECTION_STRING not set"}, 500
             )
 
+        seed = req.params.get("seed")
+        counts = None
+        if seed:
+            if req.method != "POST":
+                return _json_response({"error": "Seeding replaces data; use POST"}, 405)
+            if not SEED_ENABLED:
+                return _json_response({"error": "Seeding is disabled (set SEED_ENABLED=true)"}, 403)
+            denied = _authorize(req, ("admin",))
+            if denied:
+                return denied
+            try:
+                counts = _parse_seed_spec(seed)
+                rng_seed = int(req.params.get("random_seed", "1"))
+            except ValueError as e:
+                return _json_response({"error": str(e)}, 400)
+
         blob_service = BlobServiceClient.from_connection_string(conn_str)
         container_client = blob_service.get_container_client(container_name)
 
-        try:
-            container_client.create_container()
-            created_container = True
-        except Exception:
-            created_container = False  # already exists
+        def create_container(name):
+            try:
+                with _storage_slot():
+                    blob_service.get_container_client(name).create_container()
+                return True
+            except ResourceExistsError:
+                return False  # already exists
+
+        def blob_exists(blob_path):
+            with _storage_slot():
+                return container_client.get_blob_client(blob_path).exists()
 
         targets = [
             "employees/employees.json",
@@ -706,26 +3559,61 @@ def setup_data(req: func.HttpRequest) -> func.HttpResponse:
             "documents/documents.json",
         ]
 
+        # Provision both containers, then check every file, concurrently
+        with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+            created_container, _ = pool.map(create_container, [container_name, DOCUMENTS_CONTAINER])
+            exists = dict(zip(targets, pool.map(blob_exists, targets)))
+
         created_files = []
         existing_files = []
 
         for blob_path in targets:
-            blob_client = container_client.get_blob_client(blob_path)
-            if blob_client.exists():
+            if exists[blob_path]:
                 existing_files.append(blob_path)
             else:
-                blob_client.upload_blob(b"[]", overwrite=True)
+                with _storage_slot():
+                    container_client.get_blob_client(blob_path).upload_blob(b"[]", overwrite=True)
                 created_files.append(blob_path)
 
+        if counts:
+            conflicts = _seed_conflicts(counts)
+            if conflicts:
+                return _json_response({
+                    "error": f"{', '.join(conflicts)} still reference the current employees; "
+                             f"seed them too (e.g. {conflicts[0]}:0 to clear)"
+                }, 409)
+            result = _seed_data(counts, rng_seed)
+            result.update(container=container_name, container_created=created_container,
+                          created_files=created_files, existing_files=existing_files)
+            return _json_response(result)
+
+        # Backfill the login email index for employees created before it
+        # existed: only missing entries, written in parallel
+        indexed = 0
+        if "employees/employees.json" in existing_files:
+            indexed_paths = set(_list_blob_names(
+                blob_service_client.get_container_client(DATA_CONTAINER), "employees/email-index/"
+            ))
+            missing = [
+                employee
+                for employee in _without_tombstones("employees", _get_blob_json("employees/employees.json"))
+                if employee.get("id") and isinstance(employee.get("email"), str)
+                and _email_index_path(employee["email"]) not in indexed_paths
+            ]
+            if missing:
+                with ThreadPoolExecutor(max_workers=SEED_UPLOAD_CONCURRENCY) as pool:
+                    indexed = sum(pool.map(_backfill_email_index, missing))
+
         result = {
             "container": container_name,
             "container_created": created_container,
             "created_files": created_files,
             "existing_files": existing_files,
+            "email_index_entries": indexed,
         }
 
         return _json_response(result)
 
     except Exception as e:
         logging.exception("Error in setup_data")
-        return _json_response({"error": str(e)}, 500)
\ No newline at end of file
+        return _error_response(e)
@@ -7,13 +7,35 @@ const axiosClient = axios.create({
   },
 });
 
+// Request Interceptor: attach the signed session token issued by /auth/login,
+// and give every POST an Idempotency-Key so retries cannot create duplicates
+axiosClient.interceptors.request.use((config) => {
+  const token = localStorage.getItem('sessionToken');
+  if (token) config.headers.Authorization = `Bearer ${token}`;
+  if (config.method === 'post' && !config.headers['Idempotency-Key']) {
+    config.headers['Idempotency-Key'] = crypto.randomUUID();
+  }
+  return config;
+});
+
 // Response Interceptor: Helps debug errors easily
 axiosClient.interceptors.response.use(
   (response) => {
     return response;
   },
-  (error) => {
-    const { response } = error;
+  async (error) => {
+    const { response, config } = error;
+
+    // Retry network failures and 503 (load shed, honour Retry-After) for GETs
+    // and for POSTs, which are safe to replay thanks to their Idempotency-Key
+    const retries = config?.__retries || 0;
+    const retryable = config?.method === 'get' || !!config?.headers?.['Idempotency-Key'];
+    if ((!response || response.status === 503) && retryable && retries < 3) {
+      const delaySeconds = Number(response?.headers['retry-after']) || 2 ** retries;
+      await new Promise(resolve => setTimeout(resolve, delaySeconds * 1000));
+      return axiosClient({ ...config, __retries: retries + 1 });
+    }
+
     if (response) {
       // Log 401/403/500 errors clearly in the console
       console.error('API Error:', response.status, response.data);
@@ -2,6 +2,17 @@ import { createContext, useState, useContext, useEffect } from 'react';
 
 const AuthContext = createContext();
 
+// Session tokens are "<base64url claims>.<signature>"; the claims are readable client-side
+const decodeToken = (token) => {
+  const payload = token.split('.')[0].replace(/-/g, '+').replace(/_/g, '/');
+  return JSON.parse(atob(payload));
+};
+
+const isExpired = (token) => {
+  try { return decodeToken(token).exp * 1000 < Date.now(); }
+  catch { return true; }
+};
+
 export const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -9,29 +20,38 @@ export const AuthProvider = ({ children }) => {
   useEffect(() => {
     // 1. Check local storage on refresh to keep the user logged in
     const savedUser = localStorage.getItem('currentUser');
-    if (savedUser) {
+    const token = localStorage.getItem('sessionToken');
+    if (savedUser && (!token || !isExpired(token))) {
       setUser(JSON.parse(savedUser));
+    } else {
+      localStorage.removeItem('currentUser');
+      localStorage.removeItem('sessionToken');
     }
     setLoading(false);
   }, []);
 
-  const login = (userData) => {
-    // 2. Logic: Detect role based on position string
+  const login = (userData, token) => {
+    // 2. Role comes from the signed session token; demo users (no token)
+    // still derive it from the position string
     let role = 'employee'; // Default
     const pos = (userData.position || '').toLowerCase();
     
-    if (pos.includes('admin')) role = 'admin';
+    if (token) role = decodeToken(token).role;
+    else if (pos.includes('admin')) role = 'admin';
     else if (pos.includes('manager')) role = 'manager';
 
     // 3. Create the final user object and save it
     const finalUser = { ...userData, role };
     setUser(finalUser);
     localStorage.setItem('currentUser', JSON.stringify(finalUser));
+    if (token) localStorage.setItem('sessionToken', token);
+    else localStorage.removeItem('sessionToken');
   };
 
   const logout = () => {
     setUser(null);
     localStorage.removeItem('currentUser');
+    localStorage.removeItem('sessionToken');
   };
 
   return (
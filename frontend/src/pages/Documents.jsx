@@ -30,7 +30,7 @@ const Documents = () => {
 
   const fetchDocuments = async () => {
     try {
-      const res = await axiosClient.get('/documents');
+      const res = await axiosClient.get('/documents', { params: { expand: 'employee,task' } });
       setDocuments(res.data);
     } catch (error) {
       console.error("Error loading docs", error);
@@ -109,6 +109,13 @@ const Documents = () => {
               style={{ border: 'none', outline: 'none', width: '100%' }}
             />
           </div>
+          {/* ZIP of every file for this task (or my files); the API redirects to the archive */}
+          <a
+            href={`${import.meta.env.VITE_API_BASE_URL}/documents/bundle?${isTaskView ? `task_id=${relatedTaskId}` : `employee_id=${user.id}`}`}
+            style={{ display: 'flex', alignItems: 'center', gap: '8px', padding: '8px 14px', border: '1px solid #D0D5DD', borderRadius: '8px', color: '#344054', fontWeight: '600', textDecoration: 'none' }}
+          >
+            <FiDownload /> Download all
+          </a>
         </div>
 
         {/* Table */}
@@ -134,7 +141,11 @@ const Documents = () => {
                       </div>
                       <div>
                         <div style={{ fontWeight: '500', color: '#101828' }}>{doc.title}</div>
-                        <div style={{ fontSize: '12px', color: '#667085' }}>{doc.description}</div>
+                        <div style={{ fontSize: '12px', color: '#667085' }}>
+                          {doc.description}
+                          {doc.page_count ? ` · ${doc.page_count} pages` : ''}
+                          {doc.processing_status === 'pending' && ' · processing…'}
+                        </div>
                       </div>
                     </div>
                   </td>
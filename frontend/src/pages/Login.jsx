@@ -1,85 +1,64 @@
-import { useEffect, useState } from 'react';
+import { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
 import axiosClient from '../api/axiosClient';
 
+// Demo profiles stay client-side so there is always an Admin/Manager to test with
+const DEMO_USERS = [
+  { 
+    id: 'demo-admin-01', 
+    name: 'Demo Admin', 
+    position: 'System Administrator', // Triggers Admin Role
+    department: 'IT',
+    isDemo: true
+  },
+  { 
+    id: 'demo-manager-01', 
+    name: 'Demo Manager', 
+    position: 'Project Manager',      // Triggers Manager Role
+    department: 'Operations',
+    isDemo: true
+  },
+  { 
+    id: 'demo-employee-01', 
+    name: 'Demo Employee', 
+    position: 'Software Developer',   // Triggers Employee Role
+    department: 'Engineering',
+    isDemo: true
+  }
+];
+
 const Login = () => {
-  const [users, setUsers] = useState([]);
-  const [selectedUserId, setSelectedUserId] = useState('');
-  const [loading, setLoading] = useState(true);
+  const [email, setEmail] = useState('');
+  const [error, setError] = useState('');
+  const [loading, setLoading] = useState(false);
   
   const { login } = useAuth();
   const navigate = useNavigate();
 
-  useEffect(() => {
-    const fetchUsers = async () => {
-      try {
-        // 1. Fetch real employees from Azure
-        const res = await axiosClient.get('/employees');
-        const realEmployees = res.data;
-
-        // 2. Define Demo Users (Guarantees you always have an Admin/Manager to test with)
-        const demoUsers = [
-          { 
-            id: 'demo-admin-01', 
-            name: 'Demo Admin', 
-            position: 'System Administrator', // Triggers Admin Role
-            department: 'IT',
-            isDemo: true
-          },
-          { 
-            id: 'demo-manager-01', 
-            name: 'Demo Manager', 
-            position: 'Project Manager',      // Triggers Manager Role
-            department: 'Operations',
-            isDemo: true
-          },
-          { 
-            id: 'demo-employee-01', 
-            name: 'Demo Employee', 
-            position: 'Software Developer',   // Triggers Employee Role
-            department: 'Engineering',
-            isDemo: true
-          }
-        ];
-
-        // 3. Combine them (Real first, then Demo)
-        const allUsers = [...realEmployees, ...demoUsers];
-        setUsers(allUsers);
-        
-        // Default selection to the first user
-        if (allUsers.length > 0) {
-          setSelectedUserId(allUsers[0].id);
-        }
-
-      } catch (error) {
-        console.error("Failed to load users", error);
-        // If API fails, at least show demo users
-        setUsers([
-          { id: 'demo-admin-01', name: 'Demo Admin', position: 'System Administrator' },
-          { id: 'demo-manager-01', name: 'Demo Manager', position: 'Project Manager' },
-          { id: 'demo-employee-01', name: 'Demo Employee', position: 'Software Developer' }
-        ]);
-      } finally {
-        setLoading(false);
-      }
-    };
-
-    fetchUsers();
-  }, []);
-
-  const handleLogin = (e) => {
+  const handleLogin = async (e) => {
     e.preventDefault();
-    
-    // Find the full user object based on the ID selected
-    const userToLogin = users.find(u => u.id === selectedUserId);
-    
-    if (userToLogin) {
-      login(userToLogin);
+    setError('');
+    setLoading(true);
+
+    try {
+      // The API resolves the email through its index and returns a signed token,
+      // so the employee directory is never downloaded here
+      const res = await axiosClient.post('/auth/login', { email });
+      login(res.data.user, res.data.token);
       navigate('/'); // Redirect to Dashboard
+    } catch (error) {
+      setError(error.response?.status === 401 ? 'No employee with that email.' : 'Login failed, please retry.');
+    } finally {
+      setLoading(false);
     }
   };
 
+  const handleDemoLogin = (demoUser) => {
+    login(demoUser);
+    navigate('/');
+  };
+
   return (
     <div style={{ 
       display: 'flex', 
@@ -107,60 +86,68 @@ const Login = () => {
             C
           </div>
           <h2 style={{ marginBottom: '0.5rem', color: '#1a1a1a' }}>Cloud Corp Portal</h2>
-          <p style={{ color: '#666' }}>Select a user profile to simulate login</p>
+          <p style={{ color: '#666' }}>Sign in with your work email</p>
         </div>
 
-        {loading ? (
-          <p>Loading users...</p>
-        ) : (
-          <form onSubmit={handleLogin}>
-            <div style={{ marginBottom: '1.5rem', textAlign: 'left' }}>
-              <label style={{ display: 'block', marginBottom: '8px', fontWeight: '600', color: '#444' }}>
-                Login As:
-              </label>
-              <select
-                value={selectedUserId}
-                onChange={(e) => setSelectedUserId(e.target.value)}
-                style={{
-                  width: '100%',
-                  padding: '12px',
-                  borderRadius: '8px',
-                  border: '1px solid #ddd',
-                  fontSize: '16px',
-                  backgroundColor: '#fff',
-                  cursor: 'pointer'
-                }}
-              >
-                {users.map(u => (
-                  <option key={u.id} value={u.id}>
-                    {u.name} — {u.position} {u.isDemo ? '(Demo)' : ''}
-                  </option>
-                ))}
-              </select>
-            </div>
-
-            <button
-              type="submit"
+        <form onSubmit={handleLogin}>
+          <div style={{ marginBottom: '1.5rem', textAlign: 'left' }}>
+            <label style={{ display: 'block', marginBottom: '8px', fontWeight: '600', color: '#444' }}>
+              Work Email:
+            </label>
+            <input
+              type="email"
+              required
+              value={email}
+              onChange={(e) => setEmail(e.target.value)}
+              placeholder="you@company.com"
               style={{
                 width: '100%',
-                padding: '14px',
-                backgroundColor: '#155EEF',
-                color: 'white',
-                border: 'none',
+                padding: '12px',
                 borderRadius: '8px',
+                border: '1px solid #ddd',
                 fontSize: '16px',
-                fontWeight: '600',
-                cursor: 'pointer',
-                transition: 'background-color 0.2s',
-                boxShadow: '0 1px 2px rgba(16, 24, 40, 0.05)'
+                backgroundColor: '#fff'
               }}
-              onMouseOver={(e) => e.target.style.backgroundColor = '#104dbf'}
-              onMouseOut={(e) => e.target.style.backgroundColor = '#155EEF'}
+            />
+            {error && <p style={{ color: '#D92D20', fontSize: '14px', marginTop: '8px' }}>{error}</p>}
+          </div>
+
+          <button
+            type="submit"
+            disabled={loading}
+            style={{
+              width: '100%',
+              padding: '14px',
+              backgroundColor: '#155EEF',
+              color: 'white',
+              border: 'none',
+              borderRadius: '8px',
+              fontSize: '16px',
+              fontWeight: '600',
+              cursor: 'pointer',
+              opacity: loading ? 0.7 : 1,
+              transition: 'background-color 0.2s',
+              boxShadow: '0 1px 2px rgba(16, 24, 40, 0.05)'
+            }}
+            onMouseOver={(e) => e.target.style.backgroundColor = '#104dbf'}
+            onMouseOut={(e) => e.target.style.backgroundColor = '#155EEF'}
+          >
+            {loading ? 'Signing in...' : 'Enter Portal'}
+          </button>
+        </form>
+
+        <div style={{ marginTop: '20px', display: 'flex', gap: '8px', justifyContent: 'center', flexWrap: 'wrap' }}>
+          {DEMO_USERS.map(u => (
+            <button
+              key={u.id}
+              type="button"
+              onClick={() => handleDemoLogin(u)}
+              style={{ padding: '6px 10px', background: 'white', border: '1px solid #D0D5DD', borderRadius: '6px', cursor: 'pointer', fontSize: '13px', color: '#344054' }}
             >
-              Enter Portal
+              {u.name} (Demo)
             </button>
-          </form>
-        )}
+          ))}
+        </div>
         
         <div style={{ marginTop: '24px', fontSize: '12px', color: '#98A2B3' }}>
           Connected to Azure Functions • Blob Storage
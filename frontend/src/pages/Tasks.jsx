@@ -32,6 +32,29 @@ const Tasks = () => {
     fetchData();
   }, []);
 
+  // 1b. Live updates: the API holds the connection until a relevant task
+  // changes, then EventSource reconnects from the last event id
+  useEffect(() => {
+    const params = new URLSearchParams(canManage ? {} : { employee_id: user.id });
+    const source = new EventSource(`${import.meta.env.VITE_API_BASE_URL}/subscribe?${params}`);
+
+    source.addEventListener('tasks', (event) => {
+      const change = JSON.parse(event.data);
+      if (change.op === 'reset') { fetchData(); return; }
+      setTasks(prev => {
+        const rest = prev.filter(t => t.id !== change.id);
+        if (change.op === 'delete' || change.op === 'archive') return rest;
+        const existing = prev.find(t => t.id === change.id);
+        const employee = existing?.employee_id === change.item.employee_id ? existing.employee : null;
+        return existing
+          ? prev.map(t => t.id === change.id ? { ...change.item, employee } : t)
+          : [...rest, { ...change.item, employee }];
+      });
+    });
+
+    return () => source.close();
+  }, []);
+
   // 2. Handle Redirect from Employees Page
   useEffect(() => {
     if (location.state?.assignToId) {
@@ -46,9 +69,11 @@ const Tasks = () => {
 
   const fetchData = async () => {
     try {
+      // Assignee names come back embedded (?expand=employee); the full
+      // employee list is only needed for the manager's "Assign To" picker
       const [taskRes, empRes] = await Promise.all([
-        axiosClient.get('/tasks'),
-        axiosClient.get('/employees')
+        axiosClient.get('/tasks', { params: { expand: 'employee' } }),
+        canManage ? axiosClient.get('/employees') : Promise.resolve({ data: [] })
       ]);
       setTasks(taskRes.data);
       setEmployees(empRes.data);
@@ -61,7 +86,8 @@ const Tasks = () => {
     if (!newTask.employee_id) return alert("Please assign to an employee");
     try {
       const res = await axiosClient.post('/tasks', newTask);
-      setTasks([...tasks, res.data]); 
+      const assignee = employees.find(emp => emp.id === res.data.employee_id);
+      setTasks([...tasks, { ...res.data, employee: assignee || null }]); 
       setShowForm(false);
       setNewTask({ title: '', description: '', employee_id: '', due_date: '', status: 'pending' });
       alert("Task assigned successfully!");
@@ -105,8 +131,9 @@ const Tasks = () => {
     });
   };
 
-  const getAssigneeName = (id) => {
-    const emp = employees.find(e => e.id === id);
+  const getAssigneeName = (task) => {
+    if (task.employee) return task.employee.name;
+    const emp = employees.find(e => e.id === task.employee_id);
     return emp ? emp.name : 'Unknown Employee';
   };
 
@@ -207,7 +234,7 @@ const Tasks = () => {
                       </span>
                       {canManage && (
                         <span style={{ display: 'flex', alignItems: 'center', gap: '4px' }}>
-                          <FiUser size={14} /> {getAssigneeName(task.employee_id)}
+                          <FiUser size={14} /> {getAssigneeName(task)}
                         </span>
                       )}
                     </div>
@@ -290,11 +317,9 @@ const UploadModal = ({ task, onClose, user }) => {
       const formData = new FormData();
       formData.append('title', docAttr.title || newFile.name);
       formData.append('description', docAttr.description);
-      // SENDING ID FOR BACKEND LINKING
+      // SENDING ID FOR BACKEND LINKING (names are resolved server-side)
       formData.append('task_id', task.id); 
-      formData.append('task_name', task.title); 
       formData.append('employee_id', user.id);
-      formData.append('employee_name', user.name);
       formData.append('file', newFile);
 
       await axiosClient.post('/documents', formData, { headers: { 'Content-Type': 'multipart/form-data' } });
@@ -1,9 +1,11 @@
 # test_api.py
 import requests
 import json
+import time
 from datetime import datetime, timedelta
 
 BASE_URL = "http://localhost:7071/api"
+ADMIN_URL = "http://localhost:7071/admin/functions"  # local host only: run timer functions on demand
 
 def log(msg):
     print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
@@ -32,6 +34,14 @@ def test_employees():
     employee = r.json()
     emp_id = employee["id"]
     log(f"✓ Created employee: {emp_id}")
+
+    r = requests.post(f"{BASE_URL}/employees", json={**emp_data, "email": "JANE@example.com"})
+    assert r.status_code == 409, f"Duplicate email accepted: {r.status_code}"
+    log("✓ Duplicate email rejected (409)")
+
+    r = requests.put(f"{BASE_URL}/employees/{emp_id}", json={"email": None})
+    assert r.status_code == 400
+    log("✓ Null email rejected (400)")
     
     # Get one
     log(f"Fetching employee {emp_id}...")
@@ -173,15 +183,12 @@ def test_documents(employee_id):
     log("Creating document...")
     doc_data = {
         "title": "Contract",
-        "file_name": "contract.pdf",
-        "file_path": "docs/contract.pdf",
-        "file_size": 1024000,
-        "mime_type": "application/pdf",
         "employee_id": employee_id,
         "description": "Employment contract"
     }
-    r = requests.post(f"{BASE_URL}/documents", json=doc_data)
-    assert r.status_code == 201
+    files = {"file": ("contract.pdf", b"%PDF-1.4 test contract", "application/pdf")}
+    r = requests.post(f"{BASE_URL}/documents", data=doc_data, files=files)
+    assert r.status_code == 201, f"Create failed: {r.status_code}"
     doc = r.json()
     doc_id = doc["id"]
     log(f"✓ Created document: {doc_id}")
@@ -212,6 +219,208 @@ def test_documents(employee_id):
     log(f"✓ Deleted document")
 
 
+def test_document_dedup(employee_id):
+    log("\n=== TESTING DOCUMENT DEDUPLICATION ===")
+
+    content = f"same bytes {datetime.now().timestamp()}".encode("utf-8")
+    docs = []
+    for title in ("Copy A", "Copy B"):
+        r = requests.post(f"{BASE_URL}/documents", data={"title": title, "employee_id": employee_id},
+                          files={"file": (f"{title}.txt", content, "text/plain")})
+        assert r.status_code == 201, f"Upload failed: {r.status_code}"
+        docs.append(r.json())
+    assert not docs[0]["deduplicated"] and docs[1]["deduplicated"]
+    assert docs[0]["blob_name"] == docs[1]["blob_name"]
+    log(f"✓ Second upload shares {docs[0]['blob_name']}")
+
+    r = requests.delete(f"{BASE_URL}/documents/{docs[0]['id']}")
+    assert r.status_code == 200
+    # Physically purge the deleted record now, releasing its reference
+    r = requests.post(f"{ADMIN_URL}/purge_tombstones", json={"input": ""})
+    assert r.status_code == 202, f"Could not run purge_tombstones: {r.status_code}"
+    time.sleep(5)
+
+    r = requests.get(f"{BASE_URL}/documents/bundle",
+                     params={"employee_id": employee_id, "redirect": "false"})
+    assert r.status_code == 200
+    assert docs[1]["id"] not in r.json()["skipped"]
+    log("✓ Shared blob survived deleting one of its two records")
+
+    requests.delete(f"{BASE_URL}/documents/{docs[1]['id']}")
+
+
+# ========== EXPAND ==========
+
+def test_expand(employee_id):
+    log("\n=== TESTING EXPAND ===")
+
+    r = requests.post(f"{BASE_URL}/tasks", json={"title": "Expand check", "employee_id": employee_id})
+    assert r.status_code == 201
+    task_id = r.json()["id"]
+
+    log("Listing tasks with ?expand=employee...")
+    r = requests.get(f"{BASE_URL}/tasks", params={"expand": "employee"})
+    assert r.status_code == 200
+    task = next(t for t in r.json() if t["id"] == task_id)
+    assert task["employee"]["id"] == employee_id
+    log(f"✓ Task embeds assignee: {task['employee']['name']}")
+
+    r = requests.get(f"{BASE_URL}/tasks", params={"expand": "task"})
+    assert r.status_code == 400
+    log("✓ Unsupported expand rejected (400)")
+
+    requests.delete(f"{BASE_URL}/tasks/{task_id}")
+
+
+# ========== CHANGE FEED ==========
+
+def test_changes(employee_id):
+    log("\n=== TESTING CHANGE FEED ===")
+
+    r = requests.get(f"{BASE_URL}/tasks/changes")
+    assert r.status_code == 200
+    version = r.json()["version"]
+    log(f"✓ Current tasks version: {version}")
+
+    r = requests.post(f"{BASE_URL}/tasks", json={"title": "Delta check", "employee_id": employee_id})
+    task_id = r.json()["id"]
+    requests.delete(f"{BASE_URL}/tasks/{task_id}")
+
+    r = requests.get(f"{BASE_URL}/tasks/changes", params={"since": version})
+    assert r.status_code == 200
+    changes = [c for c in r.json()["changes"] if c["id"] == task_id]
+    assert len(changes) == 1 and changes[0]["op"] == "delete"
+    log(f"✓ Delta since {version} ends in a delete tombstone")
+
+
+# ========== AUTH ==========
+
+def test_login():
+    log("\n=== TESTING LOGIN ===")
+
+    r = requests.post(f"{BASE_URL}/employees", json={
+        "name": "Login User", "email": "Login.User@example.com",
+        "position": "Engineering Manager", "department": "Engineering"
+    })
+    assert r.status_code == 201
+    emp_id = r.json()["id"]
+
+    log("Logging in by email...")
+    r = requests.post(f"{BASE_URL}/auth/login", json={"email": "login.user@example.com"})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["user"]["id"] == emp_id and body["user"]["role"] == "manager"
+    log("✓ Email resolved through the index")
+
+    r = requests.get(f"{BASE_URL}/auth/me", headers={"Authorization": f"Bearer {body['token']}"})
+    assert r.status_code == 200 and r.json()["sub"] == emp_id
+    log("✓ Token verified by /auth/me")
+
+    requests.delete(f"{BASE_URL}/employees/{emp_id}")
+    r = requests.post(f"{BASE_URL}/auth/login", json={"email": "login.user@example.com"})
+    assert r.status_code == 401
+    log("✓ Deleted employee can no longer log in (401)")
+
+
+# ========== IDEMPOTENCY ==========
+
+def test_idempotency(employee_id):
+    log("\n=== TESTING IDEMPOTENCY ===")
+
+    headers = {"Idempotency-Key": f"test-{datetime.now().timestamp()}"}
+    task_data = {"title": "Retry-safe task", "employee_id": employee_id}
+
+    r1 = requests.post(f"{BASE_URL}/tasks", json=task_data, headers=headers)
+    r2 = requests.post(f"{BASE_URL}/tasks", json=task_data, headers=headers)
+    assert r1.status_code == 201 and r2.status_code == 201
+    assert r1.json()["id"] == r2.json()["id"]
+    assert r2.headers.get("Idempotent-Replayed") == "true"
+    log("✓ Retried POST replayed the original task")
+
+    r = requests.post(f"{BASE_URL}/tasks", json={**task_data, "title": "Other"}, headers=headers)
+    assert r.status_code == 422
+    log("✓ Key reuse with a different body rejected (422)")
+
+    requests.delete(f"{BASE_URL}/tasks/{r1.json()['id']}")
+
+
+# ========== EXPORT / IMPORT ==========
+
+def test_export_import(employee_id):
+    log("\n=== TESTING EXPORT / IMPORT ===")
+
+    r = requests.post(f"{BASE_URL}/tasks", json={"title": "Round trip", "employee_id": employee_id})
+    assert r.status_code == 201
+    task = r.json()
+
+    r = requests.get(f"{BASE_URL}/tasks/export", params={"format": "ndjson", "redirect": "false"})
+    assert r.status_code == 200
+    exported = requests.get(r.json()["url"])
+    assert exported.status_code == 200
+    lines = [json.loads(line) for line in exported.text.splitlines() if line.strip()]
+    assert any(line["id"] == task["id"] for line in lines)
+    log(f"✓ Exported {len(lines)} task(s)")
+
+    r = requests.post(f"{BASE_URL}/tasks/import", params={"format": "ndjson"}, data=exported.content,
+                      headers={"Content-Type": "application/x-ndjson"})
+    assert r.status_code == 200, f"Import failed: {r.status_code}"
+    assert r.json()["created"] == 0 and r.json()["updated"] == len(lines)
+    r = requests.get(f"{BASE_URL}/tasks/{task['id']}")
+    assert r.status_code == 200 and r.json()["title"] == "Round trip"
+    assert r.json()["created_at"] == task["created_at"]
+    log("✓ Re-importing the export updated every record in place")
+
+    duplicate = exported.content.splitlines()[0]
+    r = requests.post(f"{BASE_URL}/tasks/import", params={"format": "ndjson"}, data=duplicate + b"\n" + duplicate,
+                      headers={"Content-Type": "application/x-ndjson"})
+    assert r.status_code == 400
+    log("✓ Duplicate ids in one import rejected (400)")
+
+    r = requests.get(f"{BASE_URL}/tasks/export",
+                     params={"format": "ndjson", "redirect": "false", "include_archived": "true"})
+    assert r.status_code == 200
+    with_archive = [json.loads(line) for line in requests.get(r.json()["url"]).text.splitlines() if line.strip()]
+    assert len(with_archive) >= len(lines)
+    assert any(line["id"] == task["id"] for line in with_archive)
+    log(f"✓ Export with archived tasks: {len(with_archive)} task(s)")
+
+    requests.delete(f"{BASE_URL}/tasks/{task['id']}")
+
+
+def test_seed_data(employee_id):
+    """Replaces every collection: run last."""
+    log("\n=== TESTING SEED DATA ===")
+
+    spec = "employees:5,tasks:5,reminders:0,documents:0"
+    r = requests.get(f"{BASE_URL}/setup-data", params={"seed": spec})
+    assert r.status_code == 405, f"Expected 405 for GET, got {r.status_code}"
+    log("✓ Seeding over GET rejected (405)")
+
+    r = requests.post(f"{BASE_URL}/tasks", json={"title": "Keeps old employees", "employee_id": employee_id})
+    assert r.status_code == 201
+    r = requests.post(f"{BASE_URL}/setup-data", params={"seed": "employees:5"})
+    if r.status_code == 403:
+        log("✓ Seeding is disabled on this host (403), skipping the round trip")
+        return
+    assert r.status_code == 409, f"Expected 409 for an orphaning seed, got {r.status_code}"
+    log("✓ Seeding employees alone while tasks exist refused (409)")
+
+    seeded = []
+    for _ in range(2):
+        r = requests.post(f"{BASE_URL}/setup-data", params={"seed": spec, "random_seed": "1"})
+        assert r.status_code == 200, f"Seed failed: {r.status_code}"
+        assert r.json()["seeded"] == {"employees": 5, "tasks": 5, "reminders": 0, "documents": 0}
+        employees = requests.get(f"{BASE_URL}/employees").json()
+        tasks = requests.get(f"{BASE_URL}/tasks").json()
+        assert len(employees) == 5 and len(tasks) == 5
+        assert requests.get(f"{BASE_URL}/reminders").json() == []
+        employee_ids = {employee["id"] for employee in employees}
+        assert all(task["employee_id"] in employee_ids for task in tasks)
+        seeded.append((sorted(employee_ids), sorted(task["id"] for task in tasks)))
+    assert seeded[0] == seeded[1]
+    log("✓ Seeded 5 employees / 5 tasks, consistent and reproducible with random_seed=1")
+
+
 if __name__ == "__main__":
     try:
         setup()
@@ -219,7 +428,7 @@ if __name__ == "__main__":
         # Create a new employee to use for other tests
         emp_data = {
             "name": "Test User",
-            "email": "test@example.com",
+            "email": f"test-{datetime.now().timestamp()}@example.com",
             "position": "Developer",
             "department": "Engineering"
         }
@@ -231,6 +440,13 @@ if __name__ == "__main__":
         test_tasks(employee_id)
         test_reminders(employee_id)
         test_documents(employee_id)
+        test_document_dedup(employee_id)
+        test_expand(employee_id)
+        test_changes(employee_id)
+        test_login()
+        test_idempotency(employee_id)
+        test_export_import(employee_id)
+        test_seed_data(employee_id)  # replaces the data, keep last
         
         log("\n✅ ALL TESTS PASSED!")
         